@@ -5,14 +5,26 @@ Commands describe the input the account can do to the game.
 
 """
 
+import math
+import re
+from functools import wraps
+from types import GeneratorType
+
 from django.conf import settings
 from evennia.commands.command import Command as BaseCommand
-from evennia.utils import create, utils, search, logger
+from evennia.utils import create, utils, logger
+from evennia.objects.models import ObjectDB
+from twisted.internet.defer import Deferred
+from server.conf.at_search import best_match
+from world import game_stats, metrics, text_index, write_behind
+from world.query_pool import QueryPoolFull, defer_query
 from world.room_helpers import create_room
+from typeclasses.accounts import Account
 from typeclasses.items import Item
+from typeclasses.rooms import Room
 
-from evennia import default_cmds
-from evennia.commands.default.building import CmdDig
+from evennia import GLOBAL_SCRIPTS, default_cmds
+from evennia.commands.default import unloggedin
 
 class Command(BaseCommand):
     """
@@ -37,6 +49,64 @@ class Command(BaseCommand):
 
     pass
 
+def _step(cmd, generator, done, value=None, failure=None):
+    """
+    Advance a command generator by one step and schedule the next one
+    depending on what it yielded.
+    """
+    try:
+        if failure is not None:
+            yielded = failure.throwExceptionIntoGenerator(generator)
+        else:
+            yielded = generator.send(value)
+    except StopIteration:
+        done.callback(None)
+        return
+    except Exception:
+        logger.log_trace()
+        cmd.caller.msg("Something went wrong. Please try again.")
+        done.callback(None)
+        return
+
+    if isinstance(yielded, Deferred):
+        yielded.addCallbacks(
+            lambda result: _step(cmd, generator, done, value=result),
+            lambda fail: _step(cmd, generator, done, failure=fail),
+        )
+    elif isinstance(yielded, (int, float)):
+        utils.delay(yielded, _step, cmd, generator, done)
+    elif isinstance(yielded, str):
+        # EvMenu is big and only needed once a command asks a question
+        from evennia.utils.evmenu import get_input
+
+        def _answer(caller, prompt, result):
+            _step(cmd, generator, done, value=result)
+            return False
+
+        get_input(cmd.caller, yielded, _answer)
+    else:
+        logger.log_err("%s yielded unsupported value %r." % (cmd.key, yielded))
+        done.callback(None)
+
+def awaits_deferreds(func):
+    """
+    Decorator for a command's `func`. Besides the usual `yield <seconds>`
+    and `yield <prompt>`, the decorated generator may `yield` a Deferred
+    (such as from `Room.nearby_rooms_async`) and will be resumed with its
+    result, or have its failure raised at the `yield`, without blocking
+    the server while waiting.
+    """
+    @wraps(func)
+    def wrapper(self):
+        ret = func(self)
+        if not isinstance(ret, GeneratorType):
+            return ret
+        done = Deferred()
+        _step(self, ret, done)
+        return done
+
+    return wrapper
+
 class CmdGet(default_cmds.MuxCommand):
     """
     Usage:
@@ -71,8 +141,7 @@ class CmdGet(default_cmds.MuxCommand):
                 obj.db.desc = ""
             else:
                 return
-        if type(obj) == list:
-            obj = obj[0]
+        obj = best_match(obj, caller, self.args)
         if caller == obj:
             caller.msg("You can't get yourself.")
             return
@@ -142,8 +211,7 @@ class CmdDescribe(default_cmds.MuxCommand):
             if not obj:
                 obj = caller.search(self.args, location=caller, quiet=True)
 
-        if type(obj) == list:
-            obj = obj[0]
+        obj = best_match(obj, caller, self.args)
 
         if not obj.access(caller, "describe"):
             if obj.db.get_err_msg:
@@ -157,7 +225,9 @@ class CmdDescribe(default_cmds.MuxCommand):
 
         description = yield("How would you describe %s? Add some flavour to your description. Once the description is set, it's permanent." % (obj))
         if description:
-            obj.db.desc = description
+            write_behind.set_attribute(obj, "desc", description)
+            if obj.is_typeclass(Item, exact=False):
+                game_stats.incr("described items")
 
 class CmdTaste(default_cmds.MuxCommand):
     """
@@ -183,8 +253,7 @@ class CmdTaste(default_cmds.MuxCommand):
             if not obj:
                 obj = caller.search(self.args, location=caller, quiet=True)
 
-        if type(obj) == list:
-            obj = obj[0]
+        obj = best_match(obj, caller, self.args)
 
         current_description = obj.attributes.get('taste')
 
@@ -201,7 +270,7 @@ class CmdTaste(default_cmds.MuxCommand):
 
         description = yield("What happens when you try to taste %s? You can describe how it tastes, or what happens as a result of you trying to taste it. Once the description is set, it's permanent." % obj)
         if description:
-            obj.db.taste = description
+            write_behind.set_attribute(obj, "taste", description)
 
 
 class CmdTouch(default_cmds.MuxCommand):
@@ -229,8 +298,7 @@ class CmdTouch(default_cmds.MuxCommand):
             if not obj:
                 obj = caller.search(self.args, location=caller, quiet=True)
 
-        if type(obj) == list:
-            obj = obj[0]
+        obj = best_match(obj, caller, self.args)
 
         current_description = obj.db.touch
 
@@ -247,7 +315,7 @@ class CmdTouch(default_cmds.MuxCommand):
 
         description = yield("What happens when you try to touch %s? You can describe what it feels like, how it reacts to your touch, or what happens as a result of you trying to touch it. Once the description is set, it's permanent." % obj)
         if description:
-            obj.db.touch = description
+            write_behind.set_attribute(obj, "touch", description)
 
 
 class CmdSmell(default_cmds.MuxCommand):
@@ -275,8 +343,7 @@ class CmdSmell(default_cmds.MuxCommand):
             if not obj:
                 obj = caller.search(self.args, location=caller, quiet=True)
 
-        if type(obj) == list:
-            obj = obj[0]
+        obj = best_match(obj, caller, self.args)
 
         current_description = obj.db.smell
 
@@ -293,7 +360,7 @@ class CmdSmell(default_cmds.MuxCommand):
 
         description = yield("What happens when you try to smell %s? You can describe how it smells, or what happens as a result of you trying to smell it. Once the description is set, it's permanent." % obj)
         if description:
-            obj.db.smell = description
+            write_behind.set_attribute(obj, "smell", description)
 
 
 class CmdExplore(default_cmds.MuxCommand):
@@ -323,7 +390,18 @@ class CmdExplore(default_cmds.MuxCommand):
         "i": ("in", "o"),
         "o": ("out", "i"),
     }
+    offsets = {
+        "n": (0, -1),
+        "ne": (1, -1),
+        "e": (1, 0),
+        "se": (1, 1),
+        "s": (0, 1),
+        "sw": (-1, 1),
+        "w": (-1, 0),
+        "nw": (-1, -1),
+    }
 
+    @awaits_deferreds
     def func(self):
         if not self.lhs:
             self.caller.msg("Usage: explore <direction>")
@@ -337,6 +415,20 @@ class CmdExplore(default_cmds.MuxCommand):
             self.caller.msg(string)
             return
 
+        location = self.caller.location
+        new_coords = None
+        if explore_direction in self.offsets and location.x is not None and location.y is not None:
+            dx, dy = self.offsets[explore_direction]
+            new_coords = (location.x + dx, location.y + dy)
+            try:
+                existing = yield Room.room_at_coords_async(*new_coords)
+            except QueryPoolFull:
+                self.caller.msg("The world is busy right now. Try exploring again in a moment.")
+                return
+            if existing:
+                self.caller.msg("%s has already been explored to the %s." % (existing, self.directions[explore_direction][0]))
+                return
+
         self.caller.msg("You move %s from %s into a new area." % (self.directions[explore_direction][0], self.caller.location))
 
         new_room_name = None
@@ -346,7 +438,14 @@ class CmdExplore(default_cmds.MuxCommand):
                 break
             self.caller.msg("A name must be provided.")
 
-        new_room = create_room(self.caller, new_room_name)
+        if new_coords:
+            # someone else may have explored there while we waited for the name
+            existing = Room.room_at_coords(*new_coords)
+            if existing:
+                self.caller.msg("%s has just been explored to the %s." % (existing, self.directions[explore_direction][0]))
+                return
+
+        new_room = create_room(self.caller, new_room_name, coords=new_coords)
 
         exit_to_abbrev = explore_direction
         exit_to_name = self.directions[explore_direction][0]
@@ -390,11 +489,360 @@ class CmdMap(default_cmds.MuxCommand):
     locks = "cmd:all()"
     help_category = "Navigation"
 
+    @awaits_deferreds
     def func(self):
         caller = self.caller
 
-        map_grid = caller.location.nearby_rooms(caller.location.x, caller.location.y, 3)
+        try:
+            map_grid = yield caller.location.nearby_rooms_async(caller.location.x, caller.location.y, 3)
+        except QueryPoolFull:
+            caller.msg("The world is busy right now. Try again in a moment.")
+            return
+
+        for row in map_grid.rows():
+            caller.msg(row)
+
+class CmdMetrics(default_cmds.MuxCommand):
+    """
+    View server metrics
+
+    Usage:
+        metrics [<section>]
+
+    Shows the runtime statistics collected by the game's
+    subsystems, optionally limited to one section.
+    """
+
+    key = "metrics"
+    locks = "cmd:perm(Developer)"
+    help_category = "System"
+
+    def func(self):
+        caller = self.caller
+        stats = metrics.collect()
+        if self.args:
+            stats = {name: values for name, values in stats.items() if name.startswith(self.args.lower())}
+            if not stats:
+                caller.msg("No metrics found for '%s'." % self.args)
+                return
+
+        lines = []
+        for name, values in stats.items():
+            lines.append("|w%s|n" % name)
+            for key, value in values.items():
+                lines.append("  %s: %s" % (key, value))
+        caller.msg("\n".join(lines))
+
+class CmdReaper(default_cmds.MuxCommand):
+    """
+    View reaper progress
+
+    Usage:
+        reaper
+
+    Shows how far the reaper has got in cleaning up abandoned
+    items and dead-end rooms, and how much it has reaped.
+    """
 
-        for row in map_grid:
-            caller.msg("".join(row))
+    key = "reaper"
+    locks = "cmd:perm(Developer)"
+    help_category = "System"
 
+    def func(self):
+        reaper = GLOBAL_SCRIPTS.reaper
+        if not reaper:
+            self.caller.msg("The reaper is not running.")
+            return
+
+        lines = ["|wReaper|n (every %ss)" % reaper.interval]
+        for key, value in reaper.progress().items():
+            lines.append("  %s: %s" % (key, value))
+        self.caller.msg("\n".join(lines))
+
+class CmdSearch(default_cmds.MuxCommand):
+    """
+    Search descriptions
+
+    Usage:
+        lookup <words>
+
+    Finds things whose description, taste, touch or smell
+    mentions all of the given words.
+
+    Admins can also use:
+        lookup/all <words>  - every match, with full texts and locations
+        lookup/rebuild      - rebuild the search index from the database
+    """
+
+    key = "lookup"
+    locks = "cmd:all()"
+    switch_options = ("all", "rebuild")
+    help_category = "General"
+
+    @awaits_deferreds
+    def func(self):
+        caller = self.caller
+        moderate = "all" in self.switches or "rebuild" in self.switches
+        if moderate and not caller.check_permstring("Admin"):
+            caller.msg("Only admins can do that.")
+            return
+
+        if "rebuild" in self.switches:
+            caller.msg("Rebuilding the search index...")
+            try:
+                yield text_index.rebuild()
+            except QueryPoolFull:
+                caller.msg("The world is busy right now. Try rebuilding again in a moment.")
+                return
+            caller.msg("The search index has been rebuilt.")
+            return
+
+        if not self.args:
+            caller.msg("Usage: lookup <words>")
+            return
+        if not text_index.is_ready():
+            caller.msg("The search index is still being built. Please try again soon.")
+            return
+
+        matches = text_index.search(self.args, limit=None if moderate else settings.TEXT_SEARCH_LIMIT)
+        found = ObjectDB.objects.filter(id__in={obj_id for obj_id, _ in matches})
+        objs = {obj.id: obj for obj in found}
+        lines = []
+        for obj_id, key in matches:
+            obj = objs.get(obj_id)
+            if obj is None:
+                # deleted without going through its delete hook
+                text_index.remove_object(obj_id)
+                continue
+            text = obj.attributes.get(key) or ""
+            if moderate:
+                lines.append(
+                    "|w%s|n (%s) in %s, %s:\n  %s"
+                    % (obj.get_display_name(caller), obj.dbref, obj.location, key, text)
+                )
+            else:
+                if len(text) > 70:
+                    text = text[:67] + "..."
+                lines.append("|w%s|n (%s): %s" % (obj.get_display_name(caller), key, text))
+
+        if not lines:
+            caller.msg("Nothing matches '%s'." % self.args)
+            return
+        caller.msg("\n".join(lines))
+
+class CmdImportTime(default_cmds.MuxCommand):
+    """
+    Profile module imports
+
+    Usage:
+        importtime [<module> ...]
+
+    Imports the game modules (or the given ones) in a separate
+    Python process with -X importtime, like a reload does, and
+    shows which imports take longest.
+    """
+
+    key = "importtime"
+    locks = "cmd:perm(Developer)"
+    help_category = "System"
+
+    @awaits_deferreds
+    def func(self):
+        # developer tools are imported when used, not by every server start
+        from twisted.internet.utils import getProcessOutputAndValue
+        from world import import_profile
+
+        caller = self.caller
+        modules = self.args.split() or import_profile.GAME_MODULES
+        caller.msg("Profiling imports...")
+        args = import_profile.command_line(modules)
+        _, err, code = yield getProcessOutputAndValue(
+            args[0], args[1:], env=import_profile.environment(), path=import_profile.GAME_DIR
+        )
+        err = err.decode("utf-8", "replace")
+        lines = import_profile.report(import_profile.parse(err))
+        if code:
+            lines.append("|rThe import failed:|n\n" + err.strip().splitlines()[-1])
+        caller.msg("\n".join(lines))
+
+class CmdProfile(default_cmds.MuxCommand):
+    """
+    Profile the running server
+
+    Usage:
+        profile start [<seconds>]
+        profile stop
+        profile
+
+    Samples what the server is doing until stopped, or for the
+    given number of seconds. When it stops, the busiest game
+    functions are shown and the samples are written to a file in
+    the server log dir, in the collapsed format flamegraph tools
+    read. Without arguments, shows whether it's running.
+    """
+
+    key = "profile"
+    locks = "cmd:perm(Developer)"
+    help_category = "System"
+
+    def func(self):
+        from world import sampler
+
+        caller = self.caller
+        args = self.args.split()
+        action = args[0].lower() if args else ""
+
+        if action == "start":
+            if sampler.is_running():
+                caller.msg("The profiler is already running.")
+                return
+            try:
+                seconds = float(args[1]) if len(args) > 1 else None
+            except ValueError:
+                seconds = 0
+            if seconds is not None and not (math.isfinite(seconds) and seconds > 0):
+                caller.msg("Usage: profile start [<seconds>], with seconds above 0.")
+                return
+            # the timer belongs to the run; 'profile stop' cancels it
+            sampler.start(duration=seconds, callback=lambda filename: self._finish(caller, filename))
+            if seconds:
+                caller.msg("Profiling for %g seconds." % seconds)
+            else:
+                caller.msg("Profiling until you use 'profile stop'.")
+        elif action == "stop":
+            if not sampler.is_running():
+                caller.msg("The profiler isn't running.")
+                return
+            self._finish(caller, sampler.stop())
+        else:
+            caller.msg("The profiler is %s." % ("running" if sampler.is_running() else "stopped"))
+
+    @staticmethod
+    def _finish(caller, filename):
+        from world import sampler
+
+        lines = sampler.hotspots()
+        if filename:
+            lines.append("Stacks written to %s." % filename)
+        caller.msg("\n".join(lines))
+
+class CmdDbBench(default_cmds.MuxCommand):
+    """
+    Benchmark database writes
+
+    Usage:
+        dbbench [<count>]
+
+    Times <count> (default 200) committed writes of the rows
+    explore and describe write, to scratch copies of the object,
+    tag and Attribute tables, in the query pool, and shows
+    transactions per second under the current database profile.
+    """
+
+    key = "dbbench"
+    locks = "cmd:perm(Developer)"
+    help_category = "System"
+
+    @awaits_deferreds
+    def func(self):
+        from world import db_tuning
+
+        caller = self.caller
+        try:
+            count = int(self.args) if self.args else 200
+        except ValueError:
+            count = 0
+        if count < 1:
+            caller.msg("Usage: dbbench [<count>], with count at least 1.")
+            return
+        caller.msg("Benchmarking %i writes of each kind..." % count)
+        try:
+            rates = yield defer_query(db_tuning.benchmark, count)
+        except QueryPoolFull:
+            caller.msg("The query pool is busy right now. Try again in a moment.")
+            return
+        caller.msg(
+            "%s: explore %s/s, describe %s/s"
+            % (settings.DATABASE_PROFILE, rates["explore"], rates["describe"])
+        )
+
+def _split_credentials(args):
+    """
+    Split `<name> <password>`, where either may be in double quotes.
+    """
+    parts = [part.strip() for part in re.split(r"\"", args) if part.strip()]
+    if len(parts) == 1:
+        parts = parts[0].split(None, 1)
+    return parts
+
+class CmdUnconnectedConnect(unloggedin.CmdUnconnectedConnect):
+    """
+    connect to the game
+
+    Usage (at login screen):
+      connect accountname password
+      connect "account name" "pass word"
+
+    Use the create command to first create an account before logging in.
+
+    If you have spaces in your name, enclose it in double quotes.
+    """
+
+    @awaits_deferreds
+    def func(self):
+        session = self.caller
+        parts = _split_credentials(self.args)
+        if len(parts) == 1 and parts[0].lower() == "guest":
+            # no password to check
+            super().func()
+            return
+        if len(parts) != 2:
+            session.msg("\n\r Usage (without <>): connect <name> <password>")
+            return
+
+        name, password = parts
+        account, errors = yield Account.authenticate_async(
+            username=name, password=password, ip=session.address, session=session
+        )
+        if account:
+            session.sessionhandler.login(session, account)
+        else:
+            session.msg("|R%s|n" % "\n".join(errors))
+
+class CmdUnconnectedCreate(unloggedin.CmdUnconnectedCreate):
+    """
+    create a new account
+
+    Usage (at login screen):
+      create <accountname> <password>
+      create "account name" "pass word"
+
+    This creates a new account.
+
+    If you have spaces in your name, enclose it in double quotes.
+    """
+
+    @awaits_deferreds
+    def func(self):
+        session = self.caller
+        parts = _split_credentials(self.args.strip())
+        if len(parts) != 2:
+            session.msg(
+                "\n Usage (without <>): create <name> <password>"
+                "\nIf <name> or <password> contains spaces, enclose it in double quotes."
+            )
+            return
+
+        username, password = parts
+        account, errors = yield Account.create_async(
+            username=username, password=password, ip=session.address, session=session
+        )
+        if not account:
+            session.msg("|R%s|n" % "\n".join(errors))
+            return
+        string = "A new account '%s' was created. Welcome!"
+        if " " in username:
+            string += "\n\nYou can now log in with the command 'connect \"%s\" <your password>'."
+        else:
+            string += "\n\nYou can now log with the command 'connect %s <your password>'."
+        session.msg(string % (username, username))
@@ -17,7 +17,7 @@ own cmdsets by inheriting from them or directly from `evennia.CmdSet`.
 from evennia import default_cmds
 from evennia.commands.default import account, comms, system
 
-from commands.command import CmdDescribe, CmdExplore, CmdGet, CmdSetHome, CmdSmell, CmdTaste, CmdTouch, CmdMap
+from commands.command import CmdDescribe, CmdExplore, CmdGet, CmdSetHome, CmdSmell, CmdTaste, CmdTouch, CmdMap, CmdDbBench, CmdImportTime, CmdMetrics, CmdProfile, CmdReaper, CmdSearch, CmdUnconnectedConnect, CmdUnconnectedCreate
 
 class CharacterCmdSet(default_cmds.CharacterCmdSet):
     """
@@ -42,6 +42,7 @@ class CharacterCmdSet(default_cmds.CharacterCmdSet):
         self.add(CmdTouch)
         self.remove(system.CmdAbout())
         self.add(CmdMap)
+        self.add(CmdSearch)
 
 
 class AccountCmdSet(default_cmds.AccountCmdSet):
@@ -78,6 +79,11 @@ class AccountCmdSet(default_cmds.AccountCmdSet):
         self.remove(comms.CmdIRCStatus())
         self.remove(comms.CmdRSS2Chan())
         self.remove(comms.CmdGrapevine2Chan())
+        self.add(CmdMetrics)
+        self.add(CmdReaper)
+        self.add(CmdImportTime)
+        self.add(CmdProfile)
+        self.add(CmdDbBench)
 
 
 class UnloggedinCmdSet(default_cmds.UnloggedinCmdSet):
@@ -93,6 +99,8 @@ class UnloggedinCmdSet(default_cmds.UnloggedinCmdSet):
         Populates the cmdset
         """
         super().at_cmdset_creation()
+        self.add(CmdUnconnectedConnect)
+        self.add(CmdUnconnectedCreate)
 
 
 class SessionCmdSet(default_cmds.SessionCmdSet):
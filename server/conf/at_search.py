@@ -23,8 +23,118 @@ line to your settings file:
 
     SEARCH_AT_RESULT = "server.conf.at_search.at_search_result"
 
+Our `at_search_result` settles most multimatches itself instead of
+asking the player to pick one: an exact key beats an exact alias, which
+beats a key starting with the query, and among equals the object the
+player dealt with most recently wins. Each session keeps the last
+`settings.RECENT_OBJECTS_SIZE` objects it dealt with. Only true ties
+are left for the player to choose from. Commands doing quiet searches
+use `best_match` for the same ranking.
+
 """
 
+from collections import OrderedDict
+
+from django.conf import settings
+from evennia.utils.utils import at_search_result as default_at_search_result
+
+from world import metrics
+
+# counts up every time a session deals with an object
+_CLOCK = 0
+
+_STATS = {"multimatches": 0, "resolved": 0}
+
+
+def _session(caller):
+    sessions = caller.sessions.get() if hasattr(caller, "sessions") else None
+    return sessions[0] if sessions else None
+
+
+def _recent(caller):
+    session = _session(caller)
+    if session is None:
+        return {}
+    return session.ndb.recent_objects or {}
+
+
+def remember(caller, obj):
+    """
+    Note that `caller` just dealt with `obj`, making it win ties in
+    later searches from the same session.
+    """
+    global _CLOCK
+    session = _session(caller)
+    if session is None or obj is None:
+        return
+    recent = session.ndb.recent_objects
+    if recent is None:
+        recent = session.ndb.recent_objects = OrderedDict()
+    _CLOCK += 1
+    recent.pop(obj.id, None)
+    recent[obj.id] = _CLOCK
+    if len(recent) > settings.RECENT_OBJECTS_SIZE:
+        recent.popitem(last=False)
+
+
+def rank(matches, caller, query):
+    """
+    Find the best matches for a query, in one pass over the matches.
+
+    Args:
+        matches (list): Objects matching `query`.
+        caller (Object or Account): Who searched.
+        query (str): What they searched for.
+
+    Returns:
+        best (list): The matches that rank highest; more than one if
+            they tie.
+
+    """
+    query = query.strip().lower()
+    recent = _recent(caller)
+    best, best_score = [], None
+    for obj in matches:
+        key = obj.key.lower()
+        if key == query:
+            tier = 3
+        elif query in (alias.lower() for alias in obj.aliases.all()):
+            tier = 2
+        elif key.startswith(query):
+            tier = 1
+        else:
+            tier = 0
+        score = (tier, recent.get(obj.id, 0))
+        if best_score is None or score > best_score:
+            best, best_score = [obj], score
+        elif score == best_score:
+            best.append(obj)
+    return best
+
+
+def best_match(matches, caller, query):
+    """
+    Pick one object from the result of a quiet search.
+
+    Args:
+        matches (list or Object): What `caller.search(..., quiet=True)`
+            returned.
+        caller (Object or Account): Who searched.
+        query (str): What they searched for.
+
+    Returns:
+        obj (Object or None): The best match (the first one, if several
+            tie), or None if there were no matches.
+
+    """
+    if not isinstance(matches, list):
+        return matches
+    if not matches:
+        return None
+    obj = rank(matches, caller, query)[0] if len(matches) > 1 else matches[0]
+    remember(caller, obj)
+    return obj
+
 
 def at_search_result(matches, caller, query="", quiet=False, **kwargs):
     """
@@ -52,3 +162,18 @@ def at_search_result(matches, caller, query="", quiet=False, **kwargs):
             already have happened.
 
     """
+    if len(matches) > 1:
+        _STATS["multimatches"] += 1
+        best = rank(matches, caller, query)
+        if len(best) == 1:
+            _STATS["resolved"] += 1
+            matches = best
+    # true ties get the usual numbered multimatch list, numbered in the
+    # order of the full result so "2-ball" picks the same object next time
+    result = default_at_search_result(matches, caller, query=query, quiet=quiet, **kwargs)
+    if result is not None:
+        remember(caller, result)
+    return result
+
+
+metrics.register("search ranking", lambda: dict(_STATS))
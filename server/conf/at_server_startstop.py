@@ -16,13 +16,32 @@ at_server_cold_stop()
 
 """
 
+from world import (
+    db_tuning,
+    game_stats,
+    latency,
+    snapshot,
+    text_index,
+    warmup,
+    world_cache,
+    write_behind,
+    zones,
+)
+
 
 def at_server_start():
     """
     This is called every time the server starts up, regardless of
     how it was shut down.
     """
-    pass
+    db_tuning.install()
+    text_index.start()
+    write_behind.start()
+    warmup.start()
+    world_cache.start()
+    zones.start()
+    game_stats.start()
+    latency.start()
 
 
 def at_server_stop():
@@ -30,21 +49,27 @@ def at_server_stop():
     This is called just before the server is shut down, regardless
     of it is for a reload, reset or shutdown.
     """
-    pass
+    latency.stop()
+    game_stats.stop()
+    zones.stop()
+    world_cache.stop()
+    write_behind.stop()
+    text_index.stop()
 
 
 def at_server_reload_start():
     """
     This is called only when server starts back up after a reload.
     """
-    pass
+    snapshot.restore()
 
 
 def at_server_reload_stop():
     """
     This is called only time the server stops before a reload.
     """
-    pass
+    write_behind.flush()
+    snapshot.save()
 
 
 def at_server_cold_start():
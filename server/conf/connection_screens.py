@@ -23,6 +23,8 @@ of the screen is done by the unlogged-in "look" command.
 from django.conf import settings
 from evennia import utils
 
+from world import game_stats
+
 CONNECTION_SCREEN = """
 |b==============================================================|n
  Welcome to |g{}|n, version {}!
@@ -36,3 +38,32 @@ CONNECTION_SCREEN = """
 |b==============================================================|n""".format(
     settings.SERVERNAME, utils.get_evennia_version("short")
 )
+
+_STATS_LINE = """
+ |w{online}|n online, |w{rooms}|n places explored, |w{items}|n things described.
+|b==============================================================|n"""
+
+_RENDERED_VERSION = None
+_RENDERED_SCREEN = CONNECTION_SCREEN
+
+
+def connection_screen():
+    """
+    The connection screen with live counts from the game stats cache.
+    It is only re-rendered when the counts have been refreshed.
+    """
+    global _RENDERED_VERSION, _RENDERED_SCREEN
+    version = game_stats.version()
+    if _RENDERED_VERSION != version:
+        online = game_stats.get("online")
+        if online is None:
+            # not counted yet
+            screen = CONNECTION_SCREEN
+        else:
+            screen = CONNECTION_SCREEN + _STATS_LINE.format(
+                online=online,
+                rooms=game_stats.get("rooms", 0),
+                items=game_stats.get("described items", 0),
+            )
+        _RENDERED_VERSION, _RENDERED_SCREEN = version, screen
+    return _RENDERED_SCREEN
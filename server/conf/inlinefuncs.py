@@ -9,6 +9,10 @@ special way. Inlinefuncs are deactivated by default. To activate, add
 to your settings file. The default inlinefuncs are found in
 evennia.utils.inlinefunc.
 
+We leave them deactivated for general output, but descriptions shown
+by `look` run them through world/inline.py, which also uses the
+functions in this module.
+
 In text, usage is straightforward:
 
 $funcname([arg1,[arg2,...]])
@@ -45,7 +49,45 @@ and can be used to customize it to each session.
 
 """
 
-# def capitalize(text, *args, **kwargs):
-#    "Silly capitalize example. Used as {capitalize() ... {/capitalize"
-#    session = kwargs.get("session")
-#    return text.capitalize()
+from datetime import datetime
+
+from evennia.utils import gametime
+
+# game hours counted as night by $night() and $day()
+NIGHT_STARTS = 20
+NIGHT_ENDS = 6
+
+
+def _is_night():
+    hour = datetime.fromtimestamp(gametime.gametime(absolute=True)).hour
+    return hour >= NIGHT_STARTS or hour < NIGHT_ENDS
+
+
+def time(*args, **kwargs):
+    """
+    Usage:
+        $time()
+
+    The current game time, like "21:05".
+    """
+    return datetime.fromtimestamp(gametime.gametime(absolute=True)).strftime("%H:%M")
+
+
+def night(*args, **kwargs):
+    """
+    Usage:
+        $night(text)
+
+    Shows `text` only at night (game time).
+    """
+    return ", ".join(args) if _is_night() else ""
+
+
+def day(*args, **kwargs):
+    """
+    Usage:
+        $day(text)
+
+    Shows `text` only during the day (game time).
+    """
+    return "" if _is_night() else ", ".join(args)
@@ -26,6 +26,27 @@ as argument.
 
 """
 
+from evennia.server import inputfuncs as _default_inputfuncs
+
+from world import rate_limit
+
+
+def text(session, *args, **kwargs):
+    """
+    Main text input from the client. Rate limited per account (see
+    world/rate_limit.py) before being handed to Evennia's own `text`
+    input function.
+
+    Args:
+        session (Session): The active Session receiving the input.
+        args (tuple): The first argument is always the text input.
+
+    """
+    if args and args[0] and not rate_limit.allow(session, args[0]):
+        return
+    _default_inputfuncs.text(session, *args, **kwargs)
+
+
 # def oob_echo(session, *args, **kwargs):
 #     """
 #     Example echo function. Echoes args, kwargs sent to it.
@@ -20,6 +20,11 @@ lock functions from evennia.locks.lockfuncs.
 
 """
 
+from evennia.utils import logger
+
+# access types of the sense commands and the Attribute each one sets
+SENSES = {"describe": "desc", "taste": "taste", "touch": "touch", "smell": "smell"}
+
 # def myfalse(accessing_obj, accessed_obj, *args, **kwargs):
 #    """
 #    called in lockstring with myfalse().
@@ -28,3 +33,23 @@ lock functions from evennia.locks.lockfuncs.
 #    """
 #    print "%s tried to access %s. Access denied." % (accessing_obj, accessed_obj)
 #    return False
+
+
+def unsensed(accessing_obj, accessed_obj, *args, **kwargs):
+    """
+    Usage:
+        unsensed(desc)
+        unsensed(taste, smell)
+
+    Passes if none of the given Attributes (descriptions or senses) have
+    been set on accessed_obj yet. Descriptions are permanent once set, so
+    this is what the describe/taste/touch/smell access checks use.
+    """
+    if not args:
+        return False
+    try:
+        return not any(accessed_obj.attributes.get(attrname) for attrname in args)
+    except Exception:
+        logger.log_trace("unsensed%s failed on %s." % (args, accessed_obj))
+        return False
+
@@ -3,8 +3,11 @@
 MSSP (Mud Server Status Protocol) meta information
 
 Modify this file to specify what MUD listing sites will report about your game.
-All fields are static. The number of currently active players and your game's
-current uptime will be added automatically by Evennia.
+The number of currently active players and your game's current uptime will
+be added automatically by Evennia. AREAS, ROOMS, OBJECTS and EXITS are live:
+the Server publishes its counts (see world/game_stats.py) to
+settings.MSSP_STATS_FILE and the callables below read them from there when
+a crawler connects, since this table lives in the Portal process.
 
 You don't have to fill in everything (and most fields are not shown/used by all
 crawlers anyway); leave the default if so needed. You need to reload the server
@@ -18,9 +21,43 @@ needed on the Evennia side.
 
 """
 
+import json
+import os
+
+from django.conf import settings
+
+# the counts last read from settings.MSSP_STATS_FILE, and its mtime then
+_STATS = {}
+_STATS_MTIME = None
+
+
+def _read_stats():
+    """
+    Returns:
+        stats (dict): The counts last published by the Server, re-read
+            only when the file has changed.
+
+    """
+    global _STATS, _STATS_MTIME
+    try:
+        mtime = os.path.getmtime(settings.MSSP_STATS_FILE)
+        if mtime != _STATS_MTIME:
+            with open(settings.MSSP_STATS_FILE) as statsfile:
+                _STATS = json.load(statsfile)
+            _STATS_MTIME = mtime
+    except (OSError, ValueError):
+        # not published yet; keep the last known counts
+        pass
+    return _STATS
+
+
+def _live(key):
+    return lambda: str(_read_stats().get(key, 0))
+
+
 MSSPTable = {
     # Required fields
-    "NAME": "Mygame",  # usually the same as SERVERNAME
+    "NAME": settings.SERVERNAME,
     # Generic
     "CRAWL DELAY": "-1",  # limit how often crawler may update the listing. -1 for no limit
     "HOSTNAME": "",  # telnet hostname
@@ -47,11 +84,11 @@ MSSPTable = {
     # Cyberpunk, Dragonlance, etc. Or None if not applicable.
     "SUBGENRE": "None",
     # World
-    "AREAS": "0",
+    "AREAS": _live("areas"),
     "HELPFILES": "0",
     "MOBILES": "0",
-    "OBJECTS": "0",
-    "ROOMS": "0",  # use 0 if room-less
+    "OBJECTS": _live("items"),
+    "ROOMS": _live("rooms"),  # use 0 if room-less
     "CLASSES": "0",  # use 0 if class-less
     "LEVELS": "0",  # use 0 if level-less
     "RACES": "0",  # use 0 if race-less
@@ -81,7 +118,7 @@ MSSPTable = {
     # Extended variables
     # World
     "DBSIZE": "0",
-    "EXITS": "0",
+    "EXITS": _live("exits"),
     "EXTRA DESCRIPTIONS": "0",
     "MUDPROGS": "0",
     "MUDTRIGS": "0",
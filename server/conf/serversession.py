@@ -13,15 +13,53 @@ necessary except for the most custom and exotic designs - and even
 then it might be enough to just add custom session-level commands to
 the SessionCmdSet instead.
 
-This module is not normally called. To tell Evennia to use the class
-in this module instead of the default one, add the following to your
-settings file:
+Our ServerSession collects the plain text sent to it during one reactor
+tick and passes it on to the Portal as a single message. It also caps
+how much text a session is sent: at most `settings.SESSION_OUTPUT_BUDGET`
+characters every `settings.SESSION_OUTPUT_WINDOW` seconds and at most
+`settings.SESSION_OUTPUT_MAX_QUEUE` messages waiting for the end of the
+tick. Text past the cap is dropped and the player is told how many
+messages they missed, so a flood of room broadcasts can't make a slow
+client's output grow without bounds. Output that isn't plain text
+(prompts, OOB data, text with options) is never held back or dropped.
+`Object.msg` and `Account.msg` always pass an `options` keyword and
+`msg_contents` sends text as a `(text, {})` tuple; those count as plain
+text as long as the options and the tuple's dict are empty.
+
+It's enabled in settings.py with
 
     SERVER_SESSION_CLASS = "server.conf.serversession.ServerSession"
 
 """
 
+import time
+
+from django.conf import settings
 from evennia.server.serversession import ServerSession as BaseServerSession
+from evennia.server.sessionhandler import SESSION_HANDLER
+from twisted.internet import reactor
+
+from world import metrics
+
+_STATS = {"messages": 0, "batches": 0, "dropped": 0}
+
+
+def _plain_text(kwargs):
+    """
+    Returns:
+        text (str or None): The text of an outgoing message if it is
+            plain text that can be batched, else None.
+
+    """
+    if kwargs.get("options") or any(key not in ("text", "options") for key in kwargs):
+        return None
+    text = kwargs.get("text")
+    if isinstance(text, tuple):
+        if len(text) == 1 or (len(text) == 2 and not text[1]):
+            text = text[0]
+        else:
+            return None
+    return text if isinstance(text, str) else None
 
 
 class ServerSession(BaseServerSession):
@@ -30,8 +68,96 @@ class ServerSession(BaseServerSession):
     individual protocols to communicate with Evennia.
 
     Each account gets one or more sessions assigned to them whenever they connect
-    to the game server. All communication between game and account goes
+    to the game. All communication between game and account goes
     through their session(s).
     """
 
-    pass
+    def __init__(self):
+        super().__init__()
+        self.output_queue = []
+        self.output_bytes = 0
+        self.output_dropped = 0
+        self._flush_call = None
+        self._window_start = 0
+        self._window_bytes = 0
+
+    def data_out(self, **kwargs):
+        """
+        Queue plain text until the end of the tick; send anything else
+        right away, after whatever text is already queued.
+        """
+        text = _plain_text(kwargs)
+        if text is not None:
+            self._queue_text(text)
+        else:
+            self.flush_output()
+            super().data_out(**kwargs)
+
+    def _queue_text(self, text):
+        now = time.time()
+        if now - self._window_start >= settings.SESSION_OUTPUT_WINDOW:
+            self._window_start = now
+            self._window_bytes = 0
+        if (
+            self._window_bytes + len(text) > settings.SESSION_OUTPUT_BUDGET
+            or len(self.output_queue) >= settings.SESSION_OUTPUT_MAX_QUEUE
+        ):
+            self.output_dropped += 1
+            _STATS["dropped"] += 1
+        else:
+            self.output_queue.append(text)
+            self._window_bytes += len(text)
+            _STATS["messages"] += 1
+        if self._flush_call is None:
+            self._flush_call = reactor.callLater(0, self.flush_output)
+
+    def flush_output(self):
+        """
+        Send all queued text as one message, followed by a note of how
+        many messages were dropped since the last flush.
+        """
+        if self._flush_call is not None:
+            if self._flush_call.active():
+                self._flush_call.cancel()
+            self._flush_call = None
+        if self.output_dropped:
+            self.output_queue.append(
+                "|r[%i messages dropped: too much output]|n" % self.output_dropped
+            )
+            self.output_dropped = 0
+        if not self.output_queue:
+            return
+        text = "\n".join(self.output_queue)
+        self.output_queue = []
+        self.output_bytes += len(text)
+        _STATS["batches"] += 1
+        super().data_out(text=text)
+
+    def at_disconnect(self, reason=None):
+        """
+        Forget queued output; there is no one left to send it to.
+        """
+        if self._flush_call is not None and self._flush_call.active():
+            self._flush_call.cancel()
+        self._flush_call = None
+        self.output_queue = []
+        super().at_disconnect(reason=reason)
+
+
+def session_stats():
+    """
+    Returns:
+        stats (dict): Output totals, and bytes sent and queue depth per
+            session.
+
+    """
+    stats = dict(_STATS)
+    for session in SESSION_HANDLER.values():
+        stats["session %s" % session.sessid] = "%i bytes sent, %i queued" % (
+            getattr(session, "output_bytes", 0),
+            len(getattr(session, "output_queue", ())),
+        )
+    return stats
+
+
+metrics.register("sessions", session_stats)
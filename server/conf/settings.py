@@ -35,6 +35,219 @@ from evennia.settings_default import *
 SERVERNAME = "byo-mud"
 
 
+######################################################################
+# Database
+######################################################################
+
+# "sqlite" or "postgres", see world/db_tuning.py. Can be set with the
+# MUD_DB_PROFILE environment variable.
+DATABASE_PROFILE = os.environ.get("MUD_DB_PROFILE", "sqlite")
+
+# Applied to every new SQLite connection. WAL is remembered by the
+# database file; the others are per connection.
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    # bytes of the database file to memory-map
+    "mmap_size": 256 * 1024 * 1024,
+    # negative: KiB of page cache per connection
+    "cache_size": -64 * 1024,
+}
+
+if DATABASE_PROFILE == "postgres":
+    # Connect through a local pooler (e.g. pgbouncer in transaction
+    # mode) and keep Django's connections open between requests.
+    # Server-side cursors don't survive transaction pooling.
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.postgresql",
+            "NAME": os.environ.get("MUD_DB_NAME", "mud"),
+            "USER": os.environ.get("MUD_DB_USER", "mud"),
+            "PASSWORD": os.environ.get("MUD_DB_PASSWORD", ""),
+            "HOST": os.environ.get("MUD_DB_HOST", "127.0.0.1"),
+            "PORT": os.environ.get("MUD_DB_PORT", "6432"),
+            "CONN_MAX_AGE": 600,
+            "DISABLE_SERVER_SIDE_CURSORS": True,
+        }
+    }
+
+
+######################################################################
+# Game performance settings
+######################################################################
+
+# Worker threads used for heavy world queries (map, explore), see
+# world/query_pool.py.
+QUERY_POOL_THREADS = 4
+# How many world queries may wait for a worker before new ones are
+# turned away with a "try again" message instead of queueing up.
+QUERY_POOL_MAX_PENDING = 64
+
+# Descriptions and senses are buffered and saved in batches, see
+# world/write_behind.py. Seconds between flushes:
+WRITE_BEHIND_INTERVAL = 2
+# Append-only journal of buffered writes, replayed after a crash.
+WRITE_BEHIND_JOURNAL = os.path.join(GAME_DIR, "server", "write_behind.journal")
+# fsync the journal on every write. Survives power loss, not just a
+# crashed process, at the cost of a disk sync per description.
+WRITE_BEHIND_FSYNC = False
+
+# Preload rooms, exits and their most used Attributes after a restart,
+# see world/warmup.py. Runs in the background in batches of this size.
+WARMUP_ENABLED = True
+WARMUP_BATCH_SIZE = 500
+WARMUP_ATTRIBUTES = ("desc", "taste", "touch", "smell")
+
+# In-memory indexes are saved here before a reload and restored after
+# it, see world/snapshot.py. Older snapshots are ignored.
+SNAPSHOT_FILE = os.path.join(GAME_DIR, "server", "reload.snapshot")
+SNAPSHOT_MAX_AGE = 600
+
+# Cap on rooms kept in memory; the least recently used ones (and their
+# exits and items) are dropped from the cache, see world/world_cache.py.
+WORLD_CACHE_MAX_ROOMS = 5000
+WORLD_CACHE_SWEEP_INTERVAL = 60
+WORLD_CACHE_SWEEP_BATCH = 200
+
+# The grid is split into zones, see world/zones.py. Named regions map a
+# zone name to (min_x, min_y, max_x, max_y); all other coordinates fall
+# into square tiles of ZONE_SIZE rooms.
+ZONES = {}
+ZONE_SIZE = 32
+# Zone of rooms that have no coordinates and nowhere to inherit one from.
+DEFAULT_ZONE = "limbo"
+# Seconds between zone ticks. Only occupied zones are ticked.
+ZONE_TICK_INTERVAL = 10
+
+# Distinct lockstrings kept parsed by the lock cache, see world/locks.py.
+LOCK_CACHE_SIZE = 1024
+
+# Seconds between publishing the world counts shown on the connection
+# screen and to MSSP crawlers, see world/game_stats.py. The Portal reads
+# them from MSSP_STATS_FILE.
+GAME_STATS_INTERVAL = 60
+MSSP_STATS_FILE = os.path.join(GAME_DIR, "server", "mssp_stats.json")
+# Seconds between recounting them from the database, to correct drift.
+GAME_STATS_RECOUNT_INTERVAL = 3600
+
+# Sessions send the text they get in one tick as one message, see
+# server/conf/serversession.py. Each session gets at most
+# SESSION_OUTPUT_BUDGET characters of text every SESSION_OUTPUT_WINDOW
+# seconds and SESSION_OUTPUT_MAX_QUEUE messages per tick; the rest is
+# dropped.
+SERVER_SESSION_CLASS = "server.conf.serversession.ServerSession"
+SESSION_OUTPUT_BUDGET = 32768
+SESSION_OUTPUT_WINDOW = 1
+SESSION_OUTPUT_MAX_QUEUE = 100
+
+# Commands typed are rate limited per account with a token bucket, see
+# world/rate_limit.py. Buckets hold RATE_LIMIT_BURST tokens and refill at
+# RATE_LIMIT_RATE tokens per second. Commands cost 1 token unless listed
+# in RATE_LIMIT_COSTS (include their aliases).
+RATE_LIMIT_BURST = 20
+RATE_LIMIT_RATE = 4
+RATE_LIMIT_COSTS = {
+    "idle": 0,
+    "look": 0.5,
+    "l": 0.5,
+    "map": 2,
+    "get": 2,
+    "grab": 2,
+    "describe": 3,
+    "taste": 3,
+    "touch": 3,
+    "feel": 3,
+    "smell": 3,
+    "sniff": 3,
+    "explore": 5,
+}
+
+# Seconds channel history is buffered before being appended to the
+# channel log files, see typeclasses/channels.py. 0 writes every message
+# as it's sent.
+CHANNEL_LOG_INTERVAL = 5
+
+# Password hashing for logins and account creation runs in its own
+# thread pool, see world/auth_pool.py. At most AUTH_POOL_MAX_PENDING
+# checks wait at once, and at most AUTH_MAX_PER_IP per address.
+AUTH_POOL_THREADS = 2
+AUTH_POOL_MAX_PENDING = 32
+AUTH_MAX_PER_IP = 2
+
+# Seconds between reactor lag measurements, see world/latency.py.
+LAG_PROBE_INTERVAL = 0.5
+
+# Descriptions and senses are indexed for the `search` command, see
+# world/text_index.py. The index is saved to TEXT_INDEX_FILE every
+# TEXT_INDEX_SAVE_INTERVAL seconds. Changing TEXT_INDEX_STEMMING rebuilds
+# it at the next start.
+TEXT_INDEX_ATTRIBUTES = ("desc", "taste", "touch", "smell")
+TEXT_INDEX_STEMMING = True
+TEXT_INDEX_FILE = os.path.join(GAME_DIR, "server", "text_index.json")
+TEXT_INDEX_SAVE_INTERVAL = 300
+# Matches shown to players by `search`.
+TEXT_SEARCH_LIMIT = 10
+
+# Objects spawned per transaction by world/spawning.py.
+SPAWN_BATCH_SIZE = 250
+
+# Descriptions may use inline functions, see world/inline.py. Parsed
+# texts are cached (up to INLINE_CACHE_SIZE) and the results of the
+# functions in INLINE_PURE_FUNCS are reused within a reactor tick.
+INLINE_CACHE_SIZE = 4096
+INLINE_PURE_FUNCS = ("pad", "crop", "space", "clr", "time", "day", "night")
+# Players write these texts: calls nested deeper than Evennia's
+# INLINEFUNC_STACK_MAXSIZE leave the text as it is, and calls with a
+# number argument (like a $pad or $space width) above INLINE_MAX_WIDTH
+# are not run.
+INLINE_MAX_WIDTH = 200
+
+# Multimatches are ranked by how exactly they match and by what the
+# player dealt with recently, see server/conf/at_search.py. Each session
+# remembers this many objects.
+SEARCH_AT_RESULT = "server.conf.at_search.at_search_result"
+RECENT_OBJECTS_SIZE = 20
+
+# Seconds between stack samples of the `profile` command, see
+# world/sampler.py.
+PROFILE_INTERVAL = 0.005
+
+# Ambient effects share one timing wheel, see AmbientScheduler in
+# typeclasses/scripts.py. The wheel advances a slot every AMBIENT_TICK
+# seconds and runs at most AMBIENT_BATCH_SIZE effects per tick. New
+# effects start up to AMBIENT_JITTER (a fraction of their interval) late
+# to spread the load.
+AMBIENT_TICK = 1
+AMBIENT_WHEEL_SLOTS = 512
+AMBIENT_BATCH_SIZE = 200
+AMBIENT_JITTER = 0.5
+
+# The reaper deletes undescribed items and dead-end rooms older than
+# REAPER_MIN_AGE days, see WorldReaper in typeclasses/scripts.py. Each
+# run scans REAPER_BATCH_SIZE objects, deletes at most
+# REAPER_MAX_DELETES and stops after REAPER_TIME_BUDGET seconds.
+REAPER_INTERVAL = 60
+REAPER_MIN_AGE = 14
+REAPER_BATCH_SIZE = 100
+REAPER_MAX_DELETES = 20
+REAPER_TIME_BUDGET = 0.05
+REAPER_ARCHIVE = os.path.join(GAME_DIR, "server", "reaped.jsonl.gz")
+
+# Game-wide scripts, available as evennia.GLOBAL_SCRIPTS.<name>.
+GLOBAL_SCRIPTS = {
+    "ambient": {
+        "typeclass": "typeclasses.scripts.AmbientScheduler",
+        "interval": AMBIENT_TICK,
+        "persistent": True,
+    },
+    "reaper": {
+        "typeclass": "typeclasses.scripts.WorldReaper",
+        "interval": REAPER_INTERVAL,
+        "persistent": True,
+    },
+}
+
+
 ######################################################################
 # Settings given in secret_settings.py override those in this file.
 ######################################################################
@@ -22,7 +22,18 @@ several more options for customizing the Guest account system.
 
 """
 
+import time
+
+from django.contrib.auth.hashers import check_password, make_password
 from evennia import DefaultAccount, DefaultGuest
+from evennia.accounts.accounts import CREATION_THROTTLE, LOGIN_THROTTLE
+from evennia.accounts.models import AccountDB
+from evennia.utils import logger
+from twisted.internet import defer
+
+from typeclasses import channels
+from world import auth_pool
+from world.auth_pool import AuthPoolBusy, defer_auth
 
 
 class Account(DefaultAccount):
@@ -92,7 +103,110 @@ class Account(DefaultAccount):
 
     """
 
-    pass
+    @classmethod
+    def authenticate_async(cls, username, password, ip="", session=None):
+        """
+        Like `authenticate`, but the password is checked in the auth pool
+        (see world/auth_pool.py) instead of on the reactor thread.
+
+        Args:
+            username (str): Name of the account.
+            password (str): Password to check.
+            ip (str, optional): Address the login comes from.
+            session (Session, optional): Session trying to log in.
+
+        Returns:
+            deferred (Deferred): Fires with `(account, errors)`, where
+                account is None if the login failed.
+
+        """
+        started = time.time()
+        ip = str(ip) if ip else ""
+        if ip and LOGIN_THROTTLE.check(ip):
+            return defer.succeed(
+                (None, ["Too many login failures; please try again in a few minutes."])
+            )
+        if cls.is_banned(username=username, ip=ip):
+            logger.log_sec("Authentication Denied (Banned): %s (IP: %s)." % (username, ip))
+            LOGIN_THROTTLE.update(ip, "Too many sightings of banned artifact.")
+            return defer.succeed(
+                (
+                    None,
+                    [
+                        "|rYou have been banned and cannot continue from here."
+                        "\nIf you feel this ban is in error, please email an admin.|x"
+                    ],
+                )
+            )
+
+        # only the hash check runs in the pool; loading the account (and
+        # with it the typeclass) stays on the reactor
+        account = AccountDB.objects.get_account_from_name(username)
+        encoded = account.password if account and account.is_active else None
+
+        def _check():
+            if encoded is None:
+                # take as long as a real check, like Django's ModelBackend
+                make_password(password)
+                return False
+            return check_password(password, encoded)
+
+        def _checked(valid):
+            auth_pool.LOGIN_TIME.add(time.time() - started)
+            if not valid:
+                logger.log_sec("Authentication Failure: %s (IP: %s)." % (username, ip))
+                if ip:
+                    LOGIN_THROTTLE.update(ip, "Too many authentication failures.")
+                if session and account:
+                    account.at_failed_login(session)
+                return None, ["Username and/or password is incorrect."]
+            logger.log_sec("Authentication Success: %s (IP: %s)." % (account, ip))
+            return account, []
+
+        return defer_auth(ip, _check).addCallbacks(_checked, _busy)
+
+    @classmethod
+    def create_async(cls, **kwargs):
+        """
+        Like `create`, but the password is hashed in the auth pool.
+
+        Returns:
+            deferred (Deferred): Fires with `(account, errors)`, like the
+                return of `create`.
+
+        """
+        password = kwargs.get("password")
+        ip = str(kwargs.get("ip") or "")
+        if ip and CREATION_THROTTLE.check(ip):
+            return defer.succeed(
+                (None, ["You are creating too many accounts. Please log into an existing account."])
+            )
+
+        def _hashed(hashed):
+            with auth_pool.prehashed(password, hashed):
+                return cls.create(**kwargs)
+
+        return defer_auth(ip, make_password, password).addCallbacks(_hashed, _busy)
+
+    def set_password(self, password, **kwargs):
+        hashed = auth_pool.take_hash(password)
+        if hashed is None:
+            return super().set_password(password, **kwargs)
+        # already hashed in the auth pool by create_async
+        self.password = hashed
+        self._password = password
+        logger.log_sec("Password successfully changed for %s." % self)
+        self.at_password_change()
+
+    def at_post_login(self, session=None, **kwargs):
+        # this session should now get the messages of our channels
+        channels.account_logged_in()
+        super().at_post_login(session=session, **kwargs)
+
+
+def _busy(failure):
+    failure.trap(AuthPoolBusy)
+    return None, ["The server is busy with other logins; please try again in a moment."]
 
 
 class Guest(DefaultGuest):
@@ -12,7 +12,59 @@ to be modified.
 
 """
 
+import os
+
+from django.conf import settings
 from evennia import DefaultChannel
+from evennia.server.sessionhandler import SESSION_HANDLER
+from evennia.utils import logger
+from evennia.utils.utils import inherits_from
+from twisted.internet import reactor
+
+from world import metrics
+
+# bumped whenever someone logs in, so cached listener sessions get rebuilt
+_LOGINS = 0
+# channel log file -> lines waiting to be appended
+_LOG_BUFFER = {}
+_LOG_FLUSH = None
+
+_STATS = {"messages": 0, "deliveries": 0, "listener rebuilds": 0, "log writes": 0}
+
+
+def account_logged_in():
+    """
+    Tell channels that their online listeners may have changed. Called
+    from `Account.at_post_login`.
+    """
+    global _LOGINS
+    _LOGINS += 1
+
+
+def _flush_logs():
+    """
+    Append all buffered channel history, one write per log file.
+    """
+    global _LOG_FLUSH
+    if _LOG_FLUSH is not None and _LOG_FLUSH.active():
+        _LOG_FLUSH.cancel()
+    _LOG_FLUSH = None
+    for filename, lines in list(_LOG_BUFFER.items()):
+        try:
+            with open(os.path.join(settings.LOG_DIR, filename), "a") as logfile:
+                logfile.write("".join(lines))
+            _STATS["log writes"] += 1
+        except OSError:
+            logger.log_trace("Could not write channel log %s." % filename)
+    _LOG_BUFFER.clear()
+
+
+def _log_message(message, filename):
+    global _LOG_FLUSH
+    _LOG_BUFFER.setdefault(filename, []).append("%s [-] %s\n" % (logger.timeformat(), message))
+    if _LOG_FLUSH is None:
+        _LOG_FLUSH = reactor.callLater(settings.CHANNEL_LOG_INTERVAL, _flush_logs)
+
 
 
 class Channel(DefaultChannel):
@@ -57,6 +109,89 @@ class Channel(DefaultChannel):
         pre_send_message(msg) - runs just before a message is sent to channel
         post_send_message(msg) - called just after message was sent to channel
 
+    Messages are delivered straight to the sessions of the channel's
+    online listeners, which are looked up once and kept until someone
+    joins, leaves, is muted or unmuted, or logs in. The message is
+    formatted once by `message_transform` and each session's protocol
+    renders it in the Portal, so a message to N listeners costs one
+    format plus N session writes. The per-recipient `msg` hooks are not
+    called for accounts. With `settings.CHANNEL_LOG_INTERVAL`, history is
+    appended to the channel's log file in batches.
+
     """
 
-    pass
+    def _listeners(self):
+        """
+        Returns:
+            sessions, others (tuple): Sessions of subscribed accounts and
+                non-account subscribers, without muted ones.
+
+        """
+        listeners = self.ndb.listeners
+        if listeners is None or self.ndb.listeners_logins != _LOGINS:
+            muted = set(self.mutelist)
+            sessions, others = [], []
+            for entity in self.subscriptions.all():
+                if entity in muted:
+                    continue
+                if inherits_from(entity, "evennia.accounts.accounts.DefaultAccount"):
+                    sessions.extend(entity.sessions.all())
+                else:
+                    others.append(entity)
+            listeners = self.ndb.listeners = (sessions, others)
+            self.ndb.listeners_logins = _LOGINS
+            _STATS["listener rebuilds"] += 1
+        return listeners
+
+    def _forget_listeners(self):
+        self.ndb.listeners = None
+
+    def post_join_channel(self, joiner, **kwargs):
+        self._forget_listeners()
+        super().post_join_channel(joiner, **kwargs)
+
+    def post_leave_channel(self, leaver, **kwargs):
+        self._forget_listeners()
+        super().post_leave_channel(leaver, **kwargs)
+
+    def mute(self, subscriber, **kwargs):
+        self._forget_listeners()
+        return super().mute(subscriber, **kwargs)
+
+    def unmute(self, subscriber, **kwargs):
+        self._forget_listeners()
+        return super().unmute(subscriber, **kwargs)
+
+    def distribute_message(self, msgobj, online=False, **kwargs):
+        """
+        Send a message to every listener. Accounts only get messages
+        while they have sessions, so `online` makes no difference here.
+        """
+        message = msgobj.message
+        sessions, others = self._listeners()
+        delivered = 0
+        for session in sessions:
+            # sessions that have disconnected since the listeners were cached
+            if SESSION_HANDLER.get(session.sessid) is session:
+                session.data_out(text=message)
+                delivered += 1
+        for entity in others:
+            try:
+                entity.msg(message, from_obj=msgobj.senders, options={"from_channel": self.id})
+                delivered += 1
+            except AttributeError as err:
+                logger.log_trace("%s\nCannot send msg to '%s'." % (err, entity))
+        _STATS["messages"] += 1
+        _STATS["deliveries"] += delivered
+
+        if msgobj.keep_log:
+            filename = self.attributes.get("log_file") or "channel_%s.log" % self.key
+            if settings.CHANNEL_LOG_INTERVAL:
+                _log_message(message, filename)
+            else:
+                logger.log_file(message, filename)
+
+
+# don't lose the last few lines of history on shutdown or reload
+reactor.addSystemEventTrigger("before", "shutdown", _flush_logs)
+metrics.register("channels", lambda: dict(_STATS, **{"buffered log files": len(_LOG_BUFFER)}))
@@ -9,6 +9,8 @@ creation commands.
 """
 from evennia import DefaultCharacter
 
+from world import zones
+
 
 class Character(DefaultCharacter):
     """
@@ -31,4 +33,16 @@ class Character(DefaultCharacter):
 
     """
 
-    pass
+    def at_after_move(self, source_location, **kwargs):
+        zones.move_occupant(self, source_location, self.location)
+        super().at_after_move(source_location, **kwargs)
+
+    def at_post_puppet(self, **kwargs):
+        zones.move_occupant(self, None, self.location)
+        super().at_post_puppet(**kwargs)
+
+    def at_post_unpuppet(self, account, session=None, **kwargs):
+        location = self.location
+        super().at_post_unpuppet(account, session=session, **kwargs)
+        if self.location is None:
+            zones.move_occupant(self, location, None)
@@ -7,6 +7,10 @@ for allowing Characters to traverse the exit to its destination.
 
 """
 from evennia import DefaultExit
+from evennia.utils.utils import lazy_property
+
+from world import game_stats, world_cache, zones
+from world.locks import CachedLockHandler
 
 
 class Exit(DefaultExit):
@@ -35,4 +39,35 @@ class Exit(DefaultExit):
                                         defined, in which case that will simply be echoed.
     """
 
-    pass
+    @lazy_property
+    def locks(self):
+        return CachedLockHandler(self)
+
+    def at_object_creation(self):
+        super().at_object_creation()
+        game_stats.incr("exits")
+
+    def at_object_delete(self):
+        game_stats.incr("exits", -1)
+        return super().at_object_delete()
+
+    @property
+    def crosses_zone(self):
+        """
+        True if this exit leads into another zone than the one it's in.
+        """
+        return zones.zone_name_of(self.location) != zones.zone_name_of(self.destination)
+
+    def access(
+        self, accessing_obj, access_type="read", default=False, no_superuser_bypass=False, **kwargs
+    ):
+        if self.location:
+            world_cache.touch_room(self.location.id)
+
+        return super().access(
+            accessing_obj,
+            access_type=access_type,
+            default=default,
+            no_superuser_bypass=no_superuser_bypass,
+            **kwargs
+        )
@@ -1,11 +1,37 @@
 from evennia import DefaultObject
+from evennia.utils.utils import lazy_property
+
+from server.conf.lockfuncs import SENSES, unsensed
+from world import appearance, game_stats, text_index, world_cache
+from world.appearance import CachedAppearance
+from world.locks import CachedLockHandler
+
+class Item(CachedAppearance, DefaultObject):
+    @lazy_property
+    def locks(self):
+        return CachedLockHandler(self)
+
+    def at_object_creation(self):
+        super().at_object_creation()
+        game_stats.incr("items")
+
+    def at_object_delete(self):
+        game_stats.incr("items", -1)
+        if self.db.desc:
+            game_stats.incr("described items", -1)
+        text_index.remove_object(self.id)
+        appearance.forget(self.id)
+        return super().at_object_delete()
 
-class Item(DefaultObject):
     def access(
         self, accessing_obj, access_type="read", default=False, no_superuser_bypass=False, **kwargs
     ):
-        if access_type in ['desribe', 'taste', 'touch', 'smell']:
-            return not self.attributes.has(access_type)
+        location = self.location
+        if location and location.location is None:
+            world_cache.touch_room(location.id)
+
+        if access_type in SENSES:
+            return unsensed(accessing_obj, self, SENSES[access_type])
 
         result = super().access(
             accessing_obj,
@@ -6,9 +6,19 @@ Rooms are simple containers that has no location of their own.
 """
 
 from evennia import DefaultRoom
+from evennia.objects.models import ObjectDB
+from evennia.utils.utils import lazy_property
+from twisted.internet import defer
 
+from server.conf.lockfuncs import unsensed
+from world import appearance, coord_index, game_stats, text_index, world_cache, zones
+from world.appearance import CachedAppearance
+from world.locks import CachedLockHandler
+from world.map_grid import MapGrid
+from world.query_pool import defer_query
 
-class Room(DefaultRoom):
+
+class Room(CachedAppearance, DefaultRoom):
     """
     Rooms are like any Object, except their location is None
     (which is default). They also use basetype_setup() to
@@ -18,11 +28,17 @@ class Room(DefaultRoom):
     See examples/object.py for a list of
     properties and methods available on all Objects.
     """
+    @lazy_property
+    def locks(self):
+        return CachedLockHandler(self)
+
     def access(
         self, accessing_obj, access_type="read", default=False, no_superuser_bypass=False, **kwargs
     ):
+        world_cache.touch_room(self.id)
+
         if access_type == "describe":
-            return not self.db.desc
+            return unsensed(accessing_obj, self, "desc")
 
         result = super().access(
             accessing_obj,
@@ -33,6 +49,33 @@ class Room(DefaultRoom):
 
         return result
 
+    def at_init(self):
+        super().at_init()
+        world_cache.touch_room(self.id)
+
+    def at_object_creation(self):
+        super().at_object_creation()
+        game_stats.incr("rooms")
+
+    def at_object_delete(self):
+        game_stats.incr("rooms", -1)
+        coord_index.remove(self.id)
+        world_cache.forget_room(self.id)
+        zones.remove_room(self.id)
+        text_index.remove_object(self.id)
+        appearance.forget(self.id)
+        return super().at_object_delete()
+
+    def _index_coords(self):
+        x, y = self.x, self.y
+        coord_index.update(self.id, x, y)
+        if x is not None and y is not None:
+            zones.assign(self, zones.zone_name_for(x, y))
+
+    @property
+    def zone(self):
+        return zones.zone_of(self)
+
 
     @property
     def x(self):
@@ -46,6 +89,7 @@ class Room(DefaultRoom):
             self.tags.remove(old, category="coordx")
         if x is not None:
             self.tags.add(str(x), category="coordx")
+        self._index_coords()
 
     @property
     def y(self):
@@ -59,30 +103,91 @@ class Room(DefaultRoom):
             self.tags.remove(old, category="coordy")
         if y is not None:
             self.tags.add(str(y), category="coordy")
+        self._index_coords()
+
+    @classmethod
+    def _room_id_at_coords(cls, x, y):
+        return (
+            cls.objects.filter(db_tags__db_key=str(x), db_tags__db_category="coordx")
+            .filter(db_tags__db_key=str(y), db_tags__db_category="coordy")
+            .values_list("id", flat=True)
+            .first()
+        )
 
     @classmethod
     def room_at_coords(cls, x, y):
+        if coord_index.is_ready():
+            room_id = coord_index.room_id_at(x, y)
+            return cls.objects.get(id=room_id) if room_id is not None else None
+
         rooms = cls.objects.filter(db_tags__db_key=str(x), db_tags__db_category="coordx").filter(db_tags__db_key=str(y), db_tags__db_category="coordy")
         if rooms:
             return rooms[0]
         return None
 
+    @classmethod
+    def room_at_coords_async(cls, x, y):
+        """
+        Like `room_at_coords`, but runs the query in the query pool.
+
+        Returns:
+            deferred (Deferred): Fires with the Room at (x, y) or None.
+
+        """
+        if coord_index.is_ready():
+            return defer.succeed(cls.room_at_coords(x, y))
+
+        def _to_room(room_id):
+            return cls.objects.get(id=room_id) if room_id is not None else None
+
+        return defer_query(cls._room_id_at_coords, x, y).addCallback(_to_room)
+
+    @classmethod
+    def _nearby_coords(cls, x, y, dist):
+        """
+        Returns the (x, y) coordinates of all rooms within `dist` of (x, y).
+        Only plain values are read, so this is safe to run in a worker thread.
+        """
+        if coord_index.is_ready():
+            return coord_index.coords_near(x, y, dist)
+
+        x_r = [str(i) for i in range(x - dist, x + dist + 1)]
+        y_r = [str(i) for i in range(y - dist, y + dist + 1)]
+
+        room_ids = cls.objects.filter(db_tags__db_key__in = x_r, db_tags__db_category="coordx").filter(db_tags__db_key__in = y_r, db_tags__db_category="coordy").values_list("id", flat=True)
+
+        coords = {}
+        room_tags = ObjectDB.db_tags.through.objects.filter(
+            objectdb_id__in=list(room_ids), tag__db_category__in=("coordx", "coordy")
+        ).values_list("objectdb_id", "tag__db_key", "tag__db_category")
+        for room_id, key, category in room_tags:
+            coords.setdefault(room_id, {})[category] = int(key)
+
+        return [(c["coordx"], c["coordy"]) for c in coords.values() if len(c) == 2]
+
+    @classmethod
+    def _build_map(cls, x, y, dist, coords):
+        grid = MapGrid(x, y, dist)
+        for room_x, room_y in coords:
+            grid.mark_room(room_x, room_y)
+        return grid
+
     @classmethod
     def nearby_rooms(cls, x, y, dist):
-        rooms_map = []
-        for i in range((dist * 2) + 1):
-            rooms_map.append([' · '] * ((dist * 2) + 1))
-        rooms_map[dist][dist] = ' # '
+        return cls._build_map(x, y, dist, cls._nearby_coords(x, y, dist))
 
-        x_r = list(reversed([str(x - i) for i in range(0, dist + 1)])) + [str(x + i) for i in range(1, dist + 1)]
-        y_r = list(reversed([str(y - i) for i in range(0, dist + 1)])) + [str(y + i) for i in range(1, dist + 1)]
+    @classmethod
+    def nearby_rooms_async(cls, x, y, dist):
+        """
+        Like `nearby_rooms`, but runs the query in the query pool.
 
-        full_search = cls.objects.filter(db_tags__db_key__in = x_r, db_tags__db_category="coordx").filter(db_tags__db_key__in = y_r, db_tags__db_category="coordy")
+        Returns:
+            deferred (Deferred): Fires with the MapGrid.
 
-        for room in full_search:
-            x_rel = dist + int(room.tags.get(category="coordx")) - x
-            y_rel = dist + int(room.tags.get(category="coordy")) - y
-            if x_rel != dist and y_rel != dist:
-                rooms_map[y_rel][x_rel] = ' ■ '
+        """
+        if coord_index.is_ready():
+            return defer.succeed(cls.nearby_rooms(x, y, dist))
 
-        return rooms_map
\ No newline at end of file
+        return defer_query(cls._nearby_coords, x, y, dist).addCallback(
+            lambda coords: cls._build_map(x, y, dist, coords)
+        )
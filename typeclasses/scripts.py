@@ -12,7 +12,19 @@ just overloads its hooks to have it perform its function.
 
 """
 
+import json
+import random
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
 from evennia import DefaultScript
+from evennia.objects.models import ObjectDB
+from evennia.utils import logger
+
+from world import metrics, write_behind
 
 
 class Script(DefaultScript):
@@ -90,3 +102,317 @@ class Script(DefaultScript):
     """
 
     pass
+
+
+class AmbientScheduler(Script):
+    """
+    A single timer driving all ambient effects (weather, lingering smells,
+    decaying items and the like), instead of one Script per room.
+
+    Objects subscribe with an interval in seconds and get their
+    `at_ambient_tick()` hook (or another hook of choice) called that
+    often. Subscriptions are kept in a timing wheel of
+    `settings.AMBIENT_WHEEL_SLOTS` slots that advances one slot every
+    `settings.AMBIENT_TICK` seconds, so each tick only looks at the
+    entries that are due, however many there are in total. At most
+    `settings.AMBIENT_BATCH_SIZE` entries are run per tick; the rest roll
+    over to the next one. New subscriptions are started with a random
+    offset of up to `settings.AMBIENT_JITTER` of their interval so that
+    effects added together don't all fire on the same tick. Subscribing
+    again replaces the earlier subscription: every subscription gets a
+    new generation number and wheel entries of older generations are
+    dropped when they come due.
+
+    This is set up as the global script `ambient`:
+
+        from evennia import GLOBAL_SCRIPTS
+        GLOBAL_SCRIPTS.ambient.subscribe(room, 300)
+
+    """
+
+    def at_script_creation(self):
+        self.key = "ambient"
+        self.desc = "Runs ambient effects on a shared timing wheel"
+        self.interval = settings.AMBIENT_TICK
+        self.persistent = True
+        # "<id>-<hook>" -> (object id, hook name, interval in ticks)
+        self.db.subscriptions = {}
+
+    def at_start(self, **kwargs):
+        self.ndb.wheel = [[] for _ in range(settings.AMBIENT_WHEEL_SLOTS)]
+        self.ndb.cursor = 0
+        self.ndb.ran = 0
+        self.ndb.rolled_over = 0
+        # subkey -> generation of its current wheel entry
+        self.ndb.generations = {}
+        # working copy, so ticks don't unpickle the stored dict every time
+        self.ndb.subscriptions = dict(self.db.subscriptions)
+        for subkey, (obj_id, hook, ticks) in self.ndb.subscriptions.items():
+            self._schedule(subkey, ticks, self._next_generation(subkey), jitter=True)
+        metrics.register("ambient", self.wheel_stats)
+
+    def _next_generation(self, subkey):
+        generation = self.ndb.generations.get(subkey, 0) + 1
+        self.ndb.generations[subkey] = generation
+        return generation
+
+    def _schedule(self, subkey, ticks, generation, jitter=False):
+        if jitter:
+            ticks += random.randint(0, int(ticks * settings.AMBIENT_JITTER))
+        ticks = max(1, ticks)
+        slots = len(self.ndb.wheel)
+        # the cursor is the slot run on the next tick, so `ticks` ticks from
+        # now is `ticks - 1` slots past it; entries further away than one
+        # turn of the wheel wait out full turns
+        rounds, offset = divmod(ticks - 1, slots)
+        self.ndb.wheel[(self.ndb.cursor + offset) % slots].append([rounds, subkey, generation])
+
+    def subscribe(self, obj, interval, hook="at_ambient_tick"):
+        """
+        Call `obj.<hook>()` every `interval` seconds, replacing any
+        earlier subscription of the same object and hook.
+
+        Args:
+            obj (Object): The object to tick.
+            interval (int): Seconds between calls, rounded to whole ticks.
+            hook (str, optional): Name of the method to call on `obj`.
+
+        """
+        subkey = "%s-%s" % (obj.id, hook)
+        ticks = max(1, int(round(interval / float(settings.AMBIENT_TICK))))
+        self.db.subscriptions[subkey] = (obj.id, hook, ticks)
+        self.ndb.subscriptions[subkey] = (obj.id, hook, ticks)
+        self._schedule(subkey, ticks, self._next_generation(subkey), jitter=True)
+
+    def unsubscribe(self, obj, hook="at_ambient_tick"):
+        """
+        Stop ticking `obj.<hook>()`. Its entry drops off the wheel when due.
+        """
+        subkey = "%s-%s" % (obj.id, hook)
+        self.db.subscriptions.pop(subkey, None)
+        self.ndb.subscriptions.pop(subkey, None)
+        self.ndb.generations.pop(subkey, None)
+
+    def at_repeat(self, **kwargs):
+        wheel = self.ndb.wheel
+        cursor = self.ndb.cursor
+        due, waiting = [], []
+        for entry in wheel[cursor]:
+            if entry[0] > 0:
+                entry[0] -= 1
+                waiting.append(entry)
+            else:
+                due.append(entry)
+        wheel[cursor] = waiting
+        self.ndb.cursor = (cursor + 1) % len(wheel)
+
+        batch_size = settings.AMBIENT_BATCH_SIZE
+        if len(due) > batch_size:
+            # the next tick's slot is the one we just moved the cursor to
+            wheel[self.ndb.cursor].extend([0, subkey, generation] for _, subkey, generation in due[batch_size:])
+            self.ndb.rolled_over += len(due) - batch_size
+            due = due[:batch_size]
+
+        subscriptions = self.ndb.subscriptions
+        generations = self.ndb.generations
+        for _, subkey, generation in due:
+            if generations.get(subkey) != generation:
+                # unsubscribed or subscribed again since it was scheduled
+                continue
+            obj_id, hook, ticks = subscriptions[subkey]
+            obj = ObjectDB.get_cached_instance(obj_id) or ObjectDB.objects.filter(id=obj_id).first()
+            if obj is None:
+                del subscriptions[subkey]
+                del generations[subkey]
+                self.db.subscriptions.pop(subkey, None)
+                continue
+            try:
+                getattr(obj, hook)()
+            except Exception:
+                logger.log_trace("Ambient hook %s on %s failed." % (hook, obj))
+            self.ndb.ran += 1
+            self._schedule(subkey, ticks, generation)
+
+    def wheel_stats(self):
+        """
+        Returns:
+            stats (dict): Subscriptions, scheduled entries and run counters.
+
+        """
+        return {
+            "subscriptions": len(self.ndb.subscriptions or {}),
+            "scheduled": sum(len(slot) for slot in self.ndb.wheel or []),
+            "hooks run": self.ndb.ran,
+            "rolled over": self.ndb.rolled_over,
+        }
+
+
+_SENSES = ("desc", "taste", "touch", "smell")
+
+
+def _is_abandoned_item(item):
+    """
+    An item nobody described, tasted, touched or smelled, lying in a room
+    with nobody in it.
+    """
+    location = item.location
+    if location is None or location.location is not None:
+        # nowhere, or carried by someone
+        return False
+    if any(item.attributes.get(sense) for sense in _SENSES):
+        return False
+    return not any(obj.has_account for obj in location.contents)
+
+
+def _is_dead_end_room(room):
+    """
+    An undescribed, empty room with at most the exit back out, that
+    isn't anyone's home or one of the start rooms.
+    """
+    if room.dbref in (settings.DEFAULT_HOME, settings.START_LOCATION):
+        return False
+    if any(room.attributes.get(sense) for sense in _SENSES):
+        return False
+    contents = room.contents
+    if any(obj.destination is None for obj in contents) or len(contents) > 1:
+        return False
+    return not ObjectDB.objects.filter(db_home=room).exists()
+
+
+class WorldReaper(Script):
+    """
+    Cleans up what exploring leaves behind: items created with `get`
+    that nobody ever described and dead-end rooms that were never
+    described, once they are older than `settings.REAPER_MIN_AGE` days.
+
+    Every run looks at the next `settings.REAPER_BATCH_SIZE` items and
+    rooms in id order and reaps at most `settings.REAPER_MAX_DELETES` of
+    them, stopping early after `settings.REAPER_TIME_BUDGET` seconds, so
+    it never causes noticeable lag. After the last object it starts over
+    from the first. Reaped objects are appended to the gzipped JSON-lines
+    file `settings.REAPER_ARCHIVE` before being deleted in one
+    transaction.
+
+    Set up as the global script `reaper`; see its progress with the
+    `reaper` command.
+
+    """
+
+    def at_script_creation(self):
+        self.key = "reaper"
+        self.desc = "Reaps abandoned items and dead-end rooms"
+        self.interval = settings.REAPER_INTERVAL
+        self.persistent = True
+        self.db.cursor = 0
+        self.db.passes = 0
+        self.db.scanned = 0
+        self.db.reaped_items = 0
+        self.db.reaped_rooms = 0
+        self.db.last_run = None
+
+    def at_start(self, **kwargs):
+        metrics.register("reaper", self.progress)
+
+    def _candidates(self):
+        cutoff = timezone.now() - timedelta(days=settings.REAPER_MIN_AGE)
+        ids = list(
+            ObjectDB.objects.filter(
+                id__gt=self.db.cursor,
+                db_typeclass_path__in=(settings.BASE_ROOM_TYPECLASS, "typeclasses.items.Item"),
+                db_date_created__lt=cutoff,
+            )
+            .order_by("id")
+            .values_list("id", flat=True)[: settings.REAPER_BATCH_SIZE]
+        )
+        was_cached = {obj_id for obj_id in ids if ObjectDB.get_cached_instance(obj_id)}
+        return ids, was_cached
+
+    def at_repeat(self, **kwargs):
+        start = time.time()
+        ids, was_cached = self._candidates()
+        if not ids:
+            self.db.cursor = 0
+            self.db.passes += 1
+            return
+
+        objs = list(ObjectDB.objects.filter(id__in=ids).order_by("id"))
+        reap, keep = [], []
+        last_id = self.db.cursor
+        scanned = 0
+        for index, obj in enumerate(objs):
+            last_id = obj.id
+            scanned += 1
+            if write_behind.has_pending(obj):
+                keep.append(obj)
+            elif obj.is_typeclass(settings.BASE_ROOM_TYPECLASS, exact=True):
+                (reap if _is_dead_end_room(obj) else keep).append(obj)
+            else:
+                (reap if _is_abandoned_item(obj) else keep).append(obj)
+            if (
+                len(reap) >= settings.REAPER_MAX_DELETES
+                or time.time() - start > settings.REAPER_TIME_BUDGET
+            ):
+                # the rest is looked at again next run
+                keep.extend(objs[index + 1 :])
+                break
+
+        if reap:
+            self._archive(reap)
+            with transaction.atomic():
+                for obj in reap:
+                    if obj.is_typeclass(settings.BASE_ROOM_TYPECLASS, exact=True):
+                        self.db.reaped_rooms += 1
+                    else:
+                        self.db.reaped_items += 1
+                    obj.delete()
+
+        # don't leave what we only loaded to look at in the cache
+        for obj in keep:
+            if obj.id not in was_cached:
+                for content in obj.contents:
+                    if not content.has_account:
+                        content.flush_from_cache()
+                obj.flush_from_cache()
+
+        self.db.scanned += scanned
+        self.db.cursor = last_id
+        self.db.last_run = time.time()
+
+    def _archive(self, objs):
+        # only the reaper needs gzip; don't load it on every reload
+        import gzip
+
+        with gzip.open(settings.REAPER_ARCHIVE, "at") as archive:
+            for obj in objs:
+                location = obj.location
+                archive.write(
+                    json.dumps(
+                        {
+                            "id": obj.id,
+                            "key": obj.key,
+                            "typeclass": obj.typeclass_path,
+                            "created": obj.db_date_created.isoformat(),
+                            "location": location.id if location else None,
+                            "x": getattr(obj, "x", None),
+                            "y": getattr(obj, "y", None),
+                            "reaped": time.time(),
+                        }
+                    )
+                    + "\n"
+                )
+
+    def progress(self):
+        """
+        Returns:
+            progress (dict): Where the reaper is and what it has reaped.
+
+        """
+        last_run = self.db.last_run
+        return {
+            "cursor": self.db.cursor,
+            "full passes": self.db.passes,
+            "scanned": self.db.scanned,
+            "reaped items": self.db.reaped_items,
+            "reaped rooms": self.db.reaped_rooms,
+            "last run": "%is ago" % (time.time() - last_run) if last_run else "never",
+        }
@@ -0,0 +1,135 @@
+"""
+Appearance caching
+
+Every `look`, including the one after each move, renders the target's
+description, exits and contents from scratch: a lock check, display
+name and pluralization for every object in the room. Descriptions are
+permanent and rooms rarely change, so `CachedAppearance` keeps the
+rendered text and reuses it for as long as the name, description and
+non-player contents stay the same.
+
+The rendered text is kept here, by object id, rather than in the
+object's ndb: Evennia won't flush objects with NAttributes from the
+idmapper, which would keep every room anyone looked at in memory (see
+world/world_cache.py). `forget` drops an object's entry; it's called
+when the object is evicted or deleted.
+
+Only the parts that differ between viewers are rendered on every look:
+the players present (they come and go, and the viewer doesn't see
+themselves) and inline functions in the description (see
+world/inline.py); for Builders the #dbrefs are cached separately.
+View locks on room contents are assumed not to depend on anything else
+about the viewer.
+
+    class Room(CachedAppearance, DefaultRoom):
+        ...
+
+"""
+
+from collections import defaultdict
+
+from evennia.utils.utils import list_to_string
+
+from world import inline, metrics
+
+# object id -> {builder: (fingerprint, (header, thing strings))}
+_APPEARANCES = {}
+_STATS = {"hits": 0, "misses": 0}
+
+
+def forget(obj_id):
+    """
+    Drop the cached appearance of an object.
+
+    Args:
+        obj_id (int): Database id of the object.
+
+    """
+    _APPEARANCES.pop(obj_id, None)
+
+
+class CachedAppearance:
+    """
+    Typeclass mixin caching the viewer-independent part of
+    `return_appearance`.
+    """
+
+    def _render_appearance(self, looker):
+        """
+        Returns:
+            header, things (tuple): Name, description and exits, and the
+                display strings of the non-player contents.
+
+        """
+        exits, things = [], defaultdict(list)
+        for con in self.contents:
+            if con.has_account or not con.access(looker, "view"):
+                continue
+            key = con.get_display_name(looker)
+            if con.destination:
+                exits.append(key)
+            else:
+                things[key].append(con)
+
+        header = "|c%s|n\n" % self.get_display_name(looker)
+        desc = self.db.desc
+        if desc:
+            header += "%s" % desc
+        if exits:
+            header += "\n|wExits:|n " + list_to_string(exits)
+
+        thing_strings = []
+        for key, itemlist in sorted(things.items()):
+            nitem = len(itemlist)
+            if nitem == 1:
+                key, _ = itemlist[0].get_numbered_name(nitem, looker, key=key)
+            else:
+                key = [item.get_numbered_name(nitem, looker, key=key)[1] for item in itemlist][0]
+            thing_strings.append(key)
+        return header, thing_strings
+
+    def return_appearance(self, looker, **kwargs):
+        if not looker:
+            return ""
+        if looker.location == self and not looker.has_account:
+            # the viewer would be in the cached contents
+            return super().return_appearance(looker, **kwargs)
+
+        users = []
+        fingerprint = [self.key, self.attributes.get("desc")]
+        for con in self.contents:
+            if con.has_account:
+                if con != looker and con.access(looker, "view"):
+                    users.append("|c%s|n" % con.get_display_name(looker))
+            else:
+                fingerprint.append((con.id, con.key))
+        fingerprint = tuple(fingerprint)
+        builder = self.locks.check_lockstring(looker, "perm(Builder)")
+
+        cache = _APPEARANCES.setdefault(self.id, {})
+        try:
+            cached_fingerprint, (header, thing_strings) = cache[builder]
+        except KeyError:
+            cached_fingerprint = None
+        if cached_fingerprint == fingerprint:
+            _STATS["hits"] += 1
+        else:
+            _STATS["misses"] += 1
+            header, thing_strings = self._render_appearance(looker)
+            cache[builder] = (fingerprint, (header, thing_strings))
+
+        # descriptions may have inline functions, like $night(...)
+        header = inline.render(header, looker=looker)
+        if users or thing_strings:
+            return header + "\n|wYou see:|n " + list_to_string(users + thing_strings)
+        return header
+
+    def forget_appearance(self):
+        """
+        Drop the cached appearance, e.g. after changing something it
+        doesn't notice (like a view lock).
+        """
+        forget(self.id)
+
+
+metrics.register("appearance cache", lambda: dict(_STATS, objects=len(_APPEARANCES)))
@@ -0,0 +1,144 @@
+"""
+Auth pool
+
+Password hashing is slow on purpose, and it used to run on the reactor
+thread: a burst of logins after a restart froze the game for everyone
+while the hashes were computed. Logins and account creation now do
+their hashing here instead, in a small thread pool of its own (the
+hashing functions release the GIL, so the reactor keeps running).
+
+At most `settings.AUTH_POOL_MAX_PENDING` checks may be waiting at once,
+and at most `settings.AUTH_MAX_PER_IP` from any one address; past that
+`defer_auth` fails right away with `AuthPoolBusy`.
+
+How long logins take is recorded and shown with the reactor lag in the
+metrics, so both can be watched during a burst.
+
+"""
+
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import close_old_connections
+from twisted.internet import defer, reactor
+from twisted.internet.threads import deferToThreadPool
+from twisted.python.failure import Failure
+from twisted.python.threadpool import ThreadPool
+
+from world import metrics
+from world.latency import Recorder
+
+_POOL = None
+# address -> checks in progress
+_PER_IP = {}
+# raw password -> hash computed in the pool, while an account is created
+_PREHASHED = {}
+
+LOGIN_TIME = Recorder("login")
+
+_STATS = {"pending": 0, "peak pending": 0, "completed": 0, "failed": 0, "rejected": 0}
+
+
+class AuthPoolBusy(Exception):
+    """
+    Raised (as a failed Deferred) when too many credential checks are
+    waiting, overall or from one address.
+    """
+
+    pass
+
+
+def _get_pool():
+    global _POOL
+    if _POOL is None:
+        _POOL = ThreadPool(minthreads=1, maxthreads=settings.AUTH_POOL_THREADS, name="auth")
+        _POOL.start()
+        reactor.addSystemEventTrigger("during", "shutdown", _POOL.stop)
+    return _POOL
+
+
+def _run_in_thread(func, args, kwargs):
+    try:
+        return func(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+def _finished(result, ip):
+    _STATS["pending"] -= 1
+    _PER_IP[ip] -= 1
+    if not _PER_IP[ip]:
+        del _PER_IP[ip]
+    if isinstance(result, Failure):
+        _STATS["failed"] += 1
+    else:
+        _STATS["completed"] += 1
+    return result
+
+
+def defer_auth(ip, func, *args, **kwargs):
+    """
+    Run a credential check or password hash in the auth pool.
+
+    Args:
+        ip (str): Address of the client, for the per-address limit.
+        func (callable): Called in a worker thread. Should return plain
+            data, not typeclassed objects.
+        *args, **kwargs: Passed on to `func`.
+
+    Returns:
+        deferred (Deferred): Fires with the return of `func`, or fails
+            with `AuthPoolBusy`.
+
+    """
+    if (
+        _STATS["pending"] >= settings.AUTH_POOL_MAX_PENDING
+        or _PER_IP.get(ip, 0) >= settings.AUTH_MAX_PER_IP
+    ):
+        _STATS["rejected"] += 1
+        return defer.fail(AuthPoolBusy("Too many logins are in progress."))
+
+    _STATS["pending"] += 1
+    _STATS["peak pending"] = max(_STATS["peak pending"], _STATS["pending"])
+    _PER_IP[ip] = _PER_IP.get(ip, 0) + 1
+    deferred = deferToThreadPool(reactor, _get_pool(), _run_in_thread, func, args, kwargs)
+    deferred.addBoth(_finished, ip)
+    return deferred
+
+
+@contextmanager
+def prehashed(password, hashed):
+    """
+    Make `take_hash` return `hashed` for `password` inside the block, so
+    code that hashes synchronously (like account creation) can use a
+    hash computed in the pool instead.
+    """
+    _PREHASHED[password] = hashed
+    try:
+        yield
+    finally:
+        _PREHASHED.pop(password, None)
+
+
+def take_hash(password):
+    """
+    Returns:
+        hashed (str or None): The hash computed in the pool for
+            `password`, if we are inside `prehashed` for it.
+
+    """
+    return _PREHASHED.get(password)
+
+
+def pool_stats():
+    """
+    Returns:
+        stats (dict): Queue depth, counters and login times.
+
+    """
+    stats = dict(_STATS, **{"busy addresses": len(_PER_IP)})
+    stats.update(("login %s" % key, value) for key, value in LOGIN_TIME.stats().items())
+    return stats
+
+
+metrics.register("auth pool", pool_stats)
@@ -0,0 +1,131 @@
+"""
+Coordinate index
+
+An in-memory map between grid coordinates and room ids, so that map and
+explore don't have to join the tag table for every lookup. Rooms keep
+their coordinates in the `coordx`/`coordy` tags; `Room.x`/`Room.y`
+keep this index in step when they change and the startup warmup (see
+world/warmup.py) loads it for all existing rooms.
+
+Until the warmup has finished, `is_ready()` is False and callers should
+fall back to querying the tags. A complete index is carried over server
+reloads by the reload snapshot (see world/snapshot.py).
+
+"""
+
+from world import snapshot
+
+_BY_COORDS = {}
+_BY_ROOM = {}
+_READY = False
+
+
+def is_ready():
+    """
+    Returns:
+        ready (bool): If the index covers every room in the database.
+
+    """
+    return _READY
+
+
+def mark_ready(ready=True):
+    """
+    Mark the index as complete (or not), once every room is loaded.
+    """
+    global _READY
+    _READY = ready
+
+
+def clear():
+    """
+    Empty the index and mark it as not ready.
+    """
+    _BY_COORDS.clear()
+    _BY_ROOM.clear()
+    mark_ready(False)
+
+
+def update(room_id, x, y):
+    """
+    Set the coordinates of a room. If either coordinate is None, the
+    room is removed from the index.
+
+    Args:
+        room_id (int): Database id of the room.
+        x (int or None): The room's x coordinate.
+        y (int or None): The room's y coordinate.
+
+    """
+    old = _BY_ROOM.pop(room_id, None)
+    if old is not None and _BY_COORDS.get(old) == room_id:
+        del _BY_COORDS[old]
+    if x is not None and y is not None:
+        _BY_ROOM[room_id] = (x, y)
+        _BY_COORDS[(x, y)] = room_id
+
+
+def remove(room_id):
+    """
+    Remove a room from the index, e.g. when it's deleted.
+
+    Args:
+        room_id (int): Database id of the room.
+
+    """
+    update(room_id, None, None)
+
+
+def room_id_at(x, y):
+    """
+    Returns:
+        room_id (int or None): The id of the room at (x, y), if any.
+
+    """
+    return _BY_COORDS.get((x, y))
+
+
+def coords_of(room_id):
+    """
+    Returns:
+        coords (tuple or None): The (x, y) of the room, if it has any.
+
+    """
+    return _BY_ROOM.get(room_id)
+
+
+def coords_near(x, y, dist):
+    """
+    Returns:
+        coords (list): (x, y) of all indexed rooms within `dist` of (x, y).
+
+    """
+    return [
+        (cx, cy)
+        for cy in range(y - dist, y + dist + 1)
+        for cx in range(x - dist, x + dist + 1)
+        if (cx, cy) in _BY_COORDS
+    ]
+
+
+def size():
+    """
+    Returns:
+        size (int): Number of rooms in the index.
+
+    """
+    return len(_BY_ROOM)
+
+
+def _dump():
+    return dict(_BY_ROOM) if _READY else None
+
+
+def _load(by_room):
+    clear()
+    for room_id, (x, y) in by_room.items():
+        update(room_id, x, y)
+    mark_ready()
+
+
+snapshot.register("coord index", _dump, _load)
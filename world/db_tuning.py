@@ -0,0 +1,253 @@
+"""
+Database tuning
+
+settings.py picks a database profile with `DATABASE_PROFILE`:
+
+- "sqlite" (the default): every new SQLite connection gets the pragmas
+  in `settings.SQLITE_PRAGMAS`. WAL journaling with `synchronous=NORMAL`
+  syncs to disk once per checkpoint instead of on every commit, and
+  readers (such as the query pool) don't block the writer; mmap and a
+  bigger page cache cut down on reads.
+- "postgres": Django keeps connections open (`CONN_MAX_AGE`) and talks
+  to a local connection pooler such as pgbouncer instead of straight to
+  Postgres.
+
+`install` hooks the pragmas up; it's called at server start. `benchmark`
+measures write throughput with the rows `explore` and `describe` write,
+for comparing profiles (the `dbbench` command).
+
+"""
+
+import time
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.backends.signals import connection_created
+from evennia.utils import logger
+
+from world import metrics
+
+# Scratch copies of the tables explore and describe write to: the
+# columns they fill in, and the indexes Evennia's migrations create
+# ((columns, unique) per index).
+_BENCH_SCHEMA = (
+    (
+        "world_bench_object",
+        "db_key VARCHAR(255), db_typeclass_path VARCHAR(255), db_location_id INTEGER,"
+        " db_destination_id INTEGER, db_home_id INTEGER, db_lock_storage TEXT",
+        (
+            ("db_key", False),
+            ("db_typeclass_path", False),
+            ("db_location_id", False),
+            ("db_destination_id", False),
+            ("db_home_id", False),
+        ),
+    ),
+    (
+        "world_bench_tag",
+        "db_key VARCHAR(255), db_category VARCHAR(64), db_tagtype VARCHAR(16), db_model VARCHAR(32)",
+        (
+            ("db_key", False),
+            ("db_category", False),
+            ("db_tagtype", False),
+            ("db_model", False),
+            ("db_key, db_category, db_tagtype, db_model", True),
+        ),
+    ),
+    (
+        "world_bench_object_tags",
+        "objectdb_id INTEGER, tag_id INTEGER",
+        (("objectdb_id", False), ("tag_id", False), ("objectdb_id, tag_id", True)),
+    ),
+    (
+        "world_bench_attribute",
+        "db_key VARCHAR(255), db_value TEXT, db_category VARCHAR(128), db_model VARCHAR(32),"
+        " db_attrtype VARCHAR(16), db_lock_storage TEXT",
+        (("db_key", False), ("db_category", False), ("db_model", False), ("db_attrtype", False)),
+    ),
+    (
+        "world_bench_object_attributes",
+        "objectdb_id INTEGER, attribute_id INTEGER",
+        (("objectdb_id", False), ("attribute_id", False), ("objectdb_id, attribute_id", True)),
+    ),
+)
+_BENCH_LOCKS = "control:id(1);delete:id(1);edit:id(1);examine:perm(Builder);get:all();puppet:false()"
+
+
+def _tune(sender=None, connection=None, **kwargs):
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        for pragma, value in settings.SQLITE_PRAGMAS.items():
+            cursor.execute("PRAGMA %s = %s" % (pragma, value))
+
+
+def install():
+    """
+    Apply the database profile to new connections, and to the current
+    one if it is already open.
+    """
+    connection_created.connect(_tune, dispatch_uid="world.db_tuning")
+    if connection.connection is not None:
+        _tune(connection=connection)
+    logger.log_info("Database profile: %s (%s)." % (settings.DATABASE_PROFILE, connection.vendor))
+
+
+def db_stats():
+    """
+    Returns:
+        stats (dict): The profile in use and, for SQLite, the pragmas as
+            the database reports them.
+
+    """
+    stats = {"profile": settings.DATABASE_PROFILE, "vendor": connection.vendor}
+    if connection.vendor == "sqlite":
+        with connection.cursor() as cursor:
+            for pragma in settings.SQLITE_PRAGMAS:
+                cursor.execute("PRAGMA %s" % pragma)
+                row = cursor.fetchone()
+                stats[pragma] = row[0] if row else None
+    else:
+        stats["conn max age"] = connection.settings_dict.get("CONN_MAX_AGE")
+    return stats
+
+
+def _create_bench_tables(cursor):
+    for table, columns, indexes in _BENCH_SCHEMA:
+        cursor.execute("DROP TABLE IF EXISTS %s" % table)
+        cursor.execute("CREATE TABLE %s (id INTEGER PRIMARY KEY, %s)" % (table, columns))
+        for number, (index_columns, unique) in enumerate(indexes):
+            cursor.execute(
+                "CREATE %sINDEX %s_%i ON %s (%s)"
+                % ("UNIQUE " if unique else "", table, number, table, index_columns)
+            )
+
+
+def _drop_bench_tables(cursor):
+    for table, _, _ in _BENCH_SCHEMA:
+        cursor.execute("DROP TABLE IF EXISTS %s" % table)
+
+
+class _BenchWriter:
+    """
+    Writes rows to the scratch tables with explicit ids, so the same SQL
+    runs on SQLite and Postgres.
+    """
+
+    def __init__(self, cursor):
+        self.cursor = cursor
+        self.ids = {}
+
+    def insert(self, table, **values):
+        row_id = self.ids[table] = self.ids.get(table, 0) + 1
+        columns = ["id"] + list(values)
+        self.cursor.execute(
+            "INSERT INTO %s (%s) VALUES (%s)"
+            % (table, ", ".join(columns), ", ".join(["%s"] * len(columns))),
+            [row_id] + list(values.values()),
+        )
+        return row_id
+
+    def tag(self, obj_id, key, category, tagtype=None):
+        # like TagHandler.add: look the tag up, create it if needed, link it
+        where, params = ["db_key = %s", "db_model = %s"], [key, "objectdb"]
+        for column, value in (("db_category", category), ("db_tagtype", tagtype)):
+            if value is None:
+                where.append("%s IS NULL" % column)
+            else:
+                where.append("%s = %%s" % column)
+                params.append(value)
+        self.cursor.execute("SELECT id FROM world_bench_tag WHERE %s" % " AND ".join(where), params)
+        row = self.cursor.fetchone()
+        tag_id = row[0] if row else self.insert(
+            "world_bench_tag", db_key=key, db_category=category, db_tagtype=tagtype, db_model="objectdb"
+        )
+        self.insert("world_bench_object_tags", objectdb_id=obj_id, tag_id=tag_id)
+
+    def obj(self, key, typeclass, location=None, destination=None):
+        return self.insert(
+            "world_bench_object",
+            db_key=key,
+            db_typeclass_path=typeclass,
+            db_location_id=location,
+            db_destination_id=destination,
+            db_home_id=location,
+            db_lock_storage=_BENCH_LOCKS,
+        )
+
+    def explore(self, number, origin):
+        room = self.obj("room %i" % number, settings.BASE_ROOM_TYPECLASS)
+        self.tag(room, str(number), "coordx")
+        self.tag(room, str(number), "coordy")
+        self.tag(room, "tile %i,%i" % (number // 10, number // 10), "zone")
+        for location, destination, alias in ((origin, room, "n"), (room, origin, "s")):
+            exit = self.obj(alias, settings.BASE_EXIT_TYPECLASS, location, destination)
+            self.tag(exit, alias, None, "alias")
+        return room
+
+    def describe(self, obj_id, text):
+        attr = self.insert(
+            "world_bench_attribute",
+            db_key="desc",
+            db_value=text,
+            db_model="objectdb",
+            db_lock_storage="",
+        )
+        self.insert("world_bench_object_attributes", objectdb_id=obj_id, attribute_id=attr)
+
+
+def benchmark(count=200):
+    """
+    Time committed writes of the rows `explore` makes (a room, its
+    coordinate and zone tags, and a pair of exits with their alias
+    tags, in one transaction) and `describe` makes when its write-behind
+    flush saves a new description (an Attribute and its link, in one
+    transaction).
+
+    The rows go to scratch copies of the object, tag and Attribute
+    tables, with the indexes and unique constraints Evennia's tables
+    have, so index and link-table costs are measured. The real code
+    paths aren't used: they run typeclass hooks that must stay on the
+    reactor, and the objects they make would stay in the idmapper even
+    if the transaction was rolled back. The tables are dropped
+    afterwards, and before, in case an earlier run died halfway.
+    Blocks; run it in the query pool.
+
+    Args:
+        count (int, optional): How many of each to write, at least 1.
+
+    Returns:
+        rates (dict): Transactions per second for "explore" and "describe".
+
+    Raises:
+        ValueError: If `count` is below 1.
+
+    """
+    if count < 1:
+        raise ValueError("count must be at least 1")
+    with connection.cursor() as cursor:
+        _create_bench_tables(cursor)
+    rates = {}
+    try:
+        with connection.cursor() as cursor:
+            writer = _BenchWriter(cursor)
+            origin = writer.obj("origin", settings.BASE_ROOM_TYPECLASS)
+            rooms = []
+            start = time.perf_counter()
+            for number in range(count):
+                with transaction.atomic():
+                    rooms.append(writer.explore(number, origin))
+            rates["explore"] = round(count / (time.perf_counter() - start), 1)
+
+            start = time.perf_counter()
+            for room in rooms:
+                with transaction.atomic():
+                    writer.describe(room, "A room written by dbbench, number %i." % room)
+            rates["describe"] = round(count / (time.perf_counter() - start), 1)
+    finally:
+        with connection.cursor() as cursor:
+            _drop_bench_tables(cursor)
+    return rates
+
+
+metrics.register("database", db_stats)
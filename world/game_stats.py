@@ -0,0 +1,209 @@
+"""
+Game statistics
+
+Counts shown to people who aren't playing yet: the connection screen
+and MUD listing crawlers (MSSP). They must never cost a database query
+per connection, so they are kept as counters in memory:
+
+- the creation and deletion hooks of rooms, exits and items, and the
+  describe command, adjust the counters as things happen,
+- the counters are counted from the database in the query pool on a
+  cold start (over reloads they are carried by the reload snapshot),
+  and again every `settings.GAME_STATS_RECOUNT_INTERVAL` seconds so
+  that any drift is corrected. Changes made while a count runs are
+  logged; the count takes the ones logged before its queries started
+  as already in the database and applies only the later ones.
+
+Every `settings.GAME_STATS_INTERVAL` seconds the current counters (plus
+players online and zones) are published: `get` returns the published
+values and they're written to `settings.MSSP_STATS_FILE`, which the
+MSSP table in the Portal reads (the Portal is a separate process).
+
+    from world import game_stats
+    game_stats.get("rooms")
+
+"""
+
+import json
+import os
+
+from django.conf import settings
+from evennia.objects.models import ObjectDB
+from evennia.server.sessionhandler import SESSION_HANDLER
+from evennia.utils import logger
+from twisted.internet import task
+
+from world import metrics, snapshot, zones
+from world.query_pool import defer_query
+
+# live counters, adjusted by hooks
+_COUNTERS = {"rooms": 0, "exits": 0, "items": 0, "described items": 0}
+# if _COUNTERS include everything in the database, not just changes
+_COUNTED = False
+# (key, amount) of the changes made while a count runs, else None
+_LOG = None
+# the values last published
+_STATS = {}
+_LOOP = None
+_RECOUNT_LOOP = None
+# bumped on every publish, so renderers can tell when to redo their output
+_VERSION = 0
+
+
+def incr(key, amount=1):
+    """
+    Adjust a counter, e.g. from a creation or deletion hook.
+
+    Args:
+        key (str): One of "rooms", "exits", "items", "described items".
+        amount (int, optional): How much to add; negative to subtract.
+
+    """
+    _COUNTERS[key] += amount
+    if _LOG is not None:
+        _LOG.append((key, amount))
+
+
+def _count():
+    """
+    Count everything from the database. Runs in the query pool.
+
+    Returns:
+        seen, counts (tuple): How many logged changes were made before
+            the queries started, and the counts.
+
+    """
+    seen = len(_LOG)
+    described = ObjectDB.db_attributes.through.objects.filter(
+        objectdb__db_typeclass_path="typeclasses.items.Item",
+        attribute__db_key="desc",
+        attribute__db_category__isnull=True,
+    ).exclude(attribute__db_value="")
+    by_typeclass = ObjectDB.objects.filter
+    return seen, {
+        "rooms": by_typeclass(db_typeclass_path=settings.BASE_ROOM_TYPECLASS).count(),
+        "exits": by_typeclass(db_typeclass_path=settings.BASE_EXIT_TYPECLASS).count(),
+        "items": by_typeclass(db_typeclass_path="typeclasses.items.Item").count(),
+        "described items": described.count(),
+    }
+
+
+def _set_counted(result):
+    global _COUNTED, _LOG
+    seen, counts = result
+    later = _LOG[seen:]
+    _LOG = None
+    _COUNTERS.update(counts)
+    for key, amount in later:
+        _COUNTERS[key] += amount
+    _COUNTED = True
+    publish()
+
+
+def _count_failed(failure):
+    global _LOG
+    _LOG = None
+    logger.log_err("Game stats count failed: %s" % failure)
+
+
+def recount():
+    """
+    Count the world from the database again, in the query pool.
+    """
+    global _LOG
+    if _LOG is not None:
+        # already counting
+        return
+    _LOG = []
+    defer_query(_count).addCallbacks(_set_counted, _count_failed)
+
+
+def _write_mssp_file(stats):
+    tmpfile = settings.MSSP_STATS_FILE + ".tmp"
+    with open(tmpfile, "w") as statsfile:
+        json.dump(stats, statsfile)
+    os.replace(tmpfile, settings.MSSP_STATS_FILE)
+
+
+def publish():
+    """
+    Make the current counters visible to `get` and the MSSP table.
+    """
+    global _VERSION
+    if not _COUNTED:
+        return
+    stats = dict(_COUNTERS)
+    stats["online"] = SESSION_HANDLER.account_count()
+    stats["areas"] = len([zone for zone in zones.all_zones() if zone.rooms])
+    if stats == _STATS:
+        return
+    _STATS.clear()
+    _STATS.update(stats)
+    _VERSION += 1
+    try:
+        _write_mssp_file(stats)
+    except OSError:
+        logger.log_trace("Could not write %s." % settings.MSSP_STATS_FILE)
+
+
+def get(key, default=None):
+    """
+    Returns:
+        value (int or None): The last published count for `key`, or
+            `default` if nothing has been published yet.
+
+    """
+    return _STATS.get(key, default)
+
+
+def version():
+    """
+    Returns:
+        version (int): Changes every time new counts are published.
+
+    """
+    return _VERSION
+
+
+def start():
+    """
+    Count the world if needed and start publishing. Called at server start.
+    """
+    global _LOOP, _RECOUNT_LOOP
+    if not _COUNTED:
+        recount()
+    if _LOOP is None:
+        _LOOP = task.LoopingCall(publish)
+        _LOOP.start(settings.GAME_STATS_INTERVAL, now=True)
+    if _RECOUNT_LOOP is None:
+        _RECOUNT_LOOP = task.LoopingCall(recount)
+        _RECOUNT_LOOP.start(settings.GAME_STATS_RECOUNT_INTERVAL, now=False)
+
+
+def stop():
+    """
+    Stop publishing and recounting.
+    """
+    global _LOOP, _RECOUNT_LOOP
+    for loop in (_LOOP, _RECOUNT_LOOP):
+        if loop is not None and loop.running:
+            loop.stop()
+    _LOOP = _RECOUNT_LOOP = None
+
+
+def _dump():
+    return dict(_COUNTERS) if _COUNTED else None
+
+
+def _load(counters):
+    global _COUNTED
+    for key, value in counters.items():
+        _COUNTERS[key] = _COUNTERS.get(key, 0) + value
+    _COUNTED = True
+
+
+snapshot.register("game stats", _dump, _load)
+metrics.register(
+    "game stats",
+    lambda: dict(_COUNTERS, counted=_COUNTED, counting=_LOG is not None, published=_VERSION),
+)
@@ -0,0 +1,129 @@
+"""
+Import profiling
+
+Every reload starts a fresh Server process that imports Evennia and all
+our game modules again. To see where that time goes, this runs a
+separate Python process with `-X importtime` that imports the game
+modules the way the Server does, and summarizes the result: the modules
+that took longest, cumulatively (with everything they imported) and on
+their own.
+
+From the shell, in the game dir:
+
+    python -m world.import_profile [module ...]
+
+In-game, the `importtime` command does the same without blocking the
+server.
+
+"""
+
+import os
+import re
+import sys
+
+# what the Server imports from the game dir
+GAME_MODULES = (
+    "server.conf.settings",
+    "server.conf.at_server_startstop",
+    "server.conf.serversession",
+    "server.conf.inputfuncs",
+    "server.conf.lockfuncs",
+    "server.conf.at_search",
+    "typeclasses.accounts",
+    "typeclasses.characters",
+    "typeclasses.rooms",
+    "typeclasses.exits",
+    "typeclasses.items",
+    "typeclasses.channels",
+    "typeclasses.scripts",
+    "commands.default_cmdsets",
+)
+
+_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)$")
+
+GAME_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def command_line(modules=GAME_MODULES):
+    """
+    Returns:
+        args (list): The command running a Python that imports `modules`
+            after setting up Django and Evennia, with `-X importtime`.
+
+    """
+    code = (
+        "import django, evennia; django.setup(); evennia._init(); "
+        + "; ".join("import %s" % module for module in modules)
+    )
+    return [sys.executable, "-X", "importtime", "-c", code]
+
+
+def environment():
+    """
+    Returns:
+        env (dict): Environment for the profiled process.
+
+    """
+    env = dict(os.environ)
+    env["DJANGO_SETTINGS_MODULE"] = "server.conf.settings"
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, (GAME_DIR, env.get("PYTHONPATH"))))
+    return env
+
+
+def parse(output):
+    """
+    Parse the `-X importtime` lines of a process' stderr.
+
+    Returns:
+        entries (list): `(module, self_us, cumulative_us)` for every
+            imported module, in import order.
+
+    """
+    entries = []
+    for line in output.splitlines():
+        match = _LINE.match(line)
+        if match:
+            self_us, cumulative_us, _, module = match.groups()
+            entries.append((module, int(self_us), int(cumulative_us)))
+    return entries
+
+
+def report(entries, top=15, prefixes=("commands", "server", "typeclasses", "world")):
+    """
+    Summarize parsed import times.
+
+    Args:
+        entries (list): As returned by `parse`.
+        top (int, optional): How many modules to list per table.
+        prefixes (tuple, optional): Top-level packages of the game dir;
+            their modules get a table of their own.
+
+    Returns:
+        lines (list): The report.
+
+    """
+    if not entries:
+        return ["No import times found; did the import fail?"]
+    total = sum(self_us for _, self_us, _ in entries)
+    game = [entry for entry in entries if entry[0].split(".")[0] in prefixes]
+    lines = ["%i modules imported in %.0f ms." % (len(entries), total / 1000.0)]
+    tables = (
+        ("Slowest cumulative (with their imports):", entries, 2),
+        ("Slowest on their own:", entries, 1),
+        ("Game modules, cumulative:", game, 2),
+    )
+    for title, table, column in tables:
+        lines.append(title)
+        for entry in sorted(table, key=lambda entry: entry[column], reverse=True)[:top]:
+            lines.append("  %8.1f ms  %s" % (entry[column] / 1000.0, entry[0]))
+    return lines
+
+
+if __name__ == "__main__":
+    import subprocess
+
+    modules = sys.argv[1:] or GAME_MODULES
+    process = subprocess.run(
+        command_line(modules), cwd=GAME_DIR, env=environment(), stderr=subprocess.PIPE
+    )
+    print("\n".join(report(parse(process.stderr.decode("utf-8", "replace")))))
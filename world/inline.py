@@ -0,0 +1,282 @@
+"""
+Inline functions in descriptions
+
+Descriptions may contain inline function calls like `$time()` or
+`$night(The lanterns are lit.)`. The functions are the ones Evennia's
+inlinefuncs use (see `settings.INLINEFUNC_MODULES`, including
+server/conf/inlinefuncs.py), but they're only run on descriptions when
+they're shown, not on everything sent to players.
+
+Each distinct text is parsed once into a tree of literal strings and
+calls, kept in a cache of `settings.INLINE_CACHE_SIZE` texts, so a much
+viewed description is never parsed again. Functions listed in
+`settings.INLINE_PURE_FUNCS` depend only on their arguments and the
+clock, so their results are also remembered until the end of the
+current reactor tick: a crowd looking at the same room at once costs
+one call.
+
+The texts come from players, so they're not trusted: a text with calls
+nested deeper than `settings.INLINEFUNC_STACK_MAXSIZE` is shown as it
+is, and a call with a number argument larger than
+`settings.INLINE_MAX_WIDTH` (such as `$pad(x, 999999999)`) is not run
+but shown as written, like any call that fails.
+
+    from world import inline
+    inline.render(obj.db.desc, looker=caller)
+
+"""
+
+import re
+from collections import OrderedDict
+
+from django.conf import settings
+from evennia.utils import logger
+from evennia.utils.utils import callables_from_module
+from twisted.internet import reactor
+
+from world import metrics
+
+_CALL = re.compile(r"(?<!\\)\$([a-zA-Z_][a-zA-Z0-9_]*)\(")
+_NUMBER = re.compile(r"\s*[-+]?\d+\s*$")
+
+_FUNCS = None
+# text -> parsed tree, least recently used first
+_TREES = OrderedDict()
+# (name, args) -> result of a pure function, for this tick
+_MEMO = {}
+_MEMO_CLEAR = None
+
+_STATS = {"parsed": 0, "cache hits": 0, "calls": 0, "memo hits": 0, "rejected": 0}
+
+
+class _TooDeep(Exception):
+    """
+    Raised while parsing a text with calls nested too deeply.
+    """
+
+    pass
+
+
+class _Call:
+    """
+    A function call in a parsed text: its name, its arguments (each a
+    parsed tree) and its source, which is shown if the call fails.
+    """
+
+    __slots__ = ("name", "args", "source")
+
+    def __init__(self, name, args, source):
+        self.name = name
+        self.args = args
+        self.source = source
+
+
+def _funcs():
+    global _FUNCS
+    if _FUNCS is None:
+        _FUNCS = {}
+        for module in settings.INLINEFUNC_MODULES:
+            _FUNCS.update(callables_from_module(module))
+    return _FUNCS
+
+
+def _split_args(text, start):
+    """
+    Split the arguments of a call starting at `start`, just after its
+    opening parenthesis. A quote only quotes if it starts an argument,
+    so apostrophes in prose are just text:
+
+        >>> _split_args("$night(It's dark, 'a, b') later", 7)
+        (["It's dark", " 'a, b'"], 25)
+
+    Returns:
+        args, end (tuple): The raw argument strings and the index just
+            after the closing parenthesis, or (None, None) if it's never
+            closed.
+
+    """
+    args, depth, quote, current = [], 0, None, start
+    # if only whitespace was seen since the argument started
+    at_start = True
+    index = start
+    while index < len(text):
+        char = text[index]
+        if char == "\\":
+            index += 2
+            at_start = False
+            continue
+        if quote:
+            if char == quote:
+                quote = None
+        elif char in "\"'" and at_start:
+            quote = char
+        elif char == "(":
+            depth += 1
+            at_start = True
+            index += 1
+            continue
+        elif char == ")":
+            if depth == 0:
+                args.append(text[current:index])
+                return args, index + 1
+            depth -= 1
+        elif char == ",":
+            if depth == 0:
+                args.append(text[current:index])
+                current = index + 1
+            at_start = True
+            index += 1
+            continue
+        if not char.isspace():
+            at_start = False
+        index += 1
+    return None, None
+
+
+def _parse(text, depth):
+    """
+    Returns:
+        tree, height (tuple): Literal strings and `_Call`s, and how many
+            levels of calls are nested in the text.
+
+    Raises:
+        _TooDeep: If calls are nested more than
+            `settings.INLINEFUNC_STACK_MAXSIZE` levels deep.
+
+    """
+    tree = []
+    height = 0
+    position = 0
+    for match in _CALL.finditer(text):
+        if match.start() < position or match.group(1) not in _funcs():
+            continue
+        args, end = _split_args(text, match.end())
+        if args is None:
+            continue
+        if depth >= settings.INLINEFUNC_STACK_MAXSIZE:
+            raise _TooDeep()
+        if match.start() > position:
+            tree.append(text[position : match.start()])
+        if args == [""]:
+            args = []
+        parsed_args = []
+        for arg in args:
+            arg = arg.strip()
+            if len(arg) > 1 and arg[0] == arg[-1] and arg[0] in "\"'":
+                arg = arg[1:-1]
+            arg_tree, arg_height = _compile(arg, depth + 1)
+            parsed_args.append(arg_tree)
+            height = max(height, arg_height)
+        tree.append(_Call(match.group(1), tuple(parsed_args), text[match.start() : end]))
+        position = end
+    if position < len(text):
+        tree.append(text[position:])
+    if any(isinstance(part, _Call) for part in tree):
+        height += 1
+    tree = tuple(part.replace("\\$", "$") if isinstance(part, str) else part for part in tree)
+    return tree, height
+
+
+def _cache(text, tree, height):
+    _TREES[text] = (tree, height)
+    if len(_TREES) > settings.INLINE_CACHE_SIZE:
+        _TREES.popitem(last=False)
+
+
+def _compile(text, depth=0):
+    """
+    Returns:
+        tree, height (tuple): The parsed text and how many levels of
+            calls are nested in it, from the cache if possible.
+
+    Raises:
+        _TooDeep: If the text, at nesting level `depth`, would nest
+            calls more than `settings.INLINEFUNC_STACK_MAXSIZE` deep.
+
+    """
+    try:
+        tree, height = _TREES[text]
+        _TREES.move_to_end(text)
+        _STATS["cache hits"] += 1
+    except KeyError:
+        tree, height = _parse(text, depth)
+        _STATS["parsed"] += 1
+        _cache(text, tree, height)
+    # a cached text may have been parsed at a shallower level
+    if depth + height > settings.INLINEFUNC_STACK_MAXSIZE:
+        raise _TooDeep()
+    return tree, height
+
+
+def _clear_memo():
+    global _MEMO_CLEAR
+    _MEMO.clear()
+    _MEMO_CLEAR = None
+
+
+def _call(call, kwargs):
+    try:
+        args = tuple(_evaluate(arg, kwargs) for arg in call.args)
+    except Exception:
+        logger.log_trace("Inline function %s failed." % call.source)
+        return call.source
+    if any(_NUMBER.match(arg) and abs(int(arg)) > settings.INLINE_MAX_WIDTH for arg in args):
+        _STATS["rejected"] += 1
+        return call.source
+    pure = call.name in settings.INLINE_PURE_FUNCS
+    if pure:
+        try:
+            result = _MEMO[(call.name, args)]
+            _STATS["memo hits"] += 1
+            return result
+        except KeyError:
+            pass
+    _STATS["calls"] += 1
+    try:
+        result = str(_funcs()[call.name](*args, **kwargs))
+    except Exception:
+        logger.log_trace("Inline function %s failed." % call.source)
+        return call.source
+    if pure:
+        global _MEMO_CLEAR
+        _MEMO[(call.name, args)] = result
+        if _MEMO_CLEAR is None:
+            _MEMO_CLEAR = reactor.callLater(0, _clear_memo)
+    return result
+
+
+def _evaluate(tree, kwargs):
+    if len(tree) == 1 and isinstance(tree[0], str):
+        return tree[0]
+    return "".join(part if isinstance(part, str) else _call(part, kwargs) for part in tree)
+
+
+def render(text, **kwargs):
+    """
+    Run the inline functions in a text.
+
+    Args:
+        text (str): Text that may contain `$func(...)` calls.
+        **kwargs: Passed on to every function, such as `looker` or
+            `session`.
+
+    Returns:
+        text (str): The text with every call replaced by its result.
+            Calls that fail are left as they are, and so is the whole
+            text if its calls are nested too deeply.
+
+    """
+    if not text or "$" not in text:
+        return text
+    try:
+        tree, _ = _compile(text)
+    except _TooDeep:
+        _STATS["rejected"] += 1
+        # remember it as plain text, so it isn't parsed again, and as too
+        # deep, so texts containing it are too
+        tree = (text,)
+        _cache(text, tree, settings.INLINEFUNC_STACK_MAXSIZE + 1)
+    return _evaluate(tree, kwargs)
+
+
+metrics.register("inline functions", lambda: dict(_STATS, **{"cached texts": len(_TREES)}))
@@ -0,0 +1,99 @@
+"""
+Latency
+
+`Recorder` keeps the last few hundred samples of a duration and reports
+their percentiles. The reactor lag probe uses one to measure how late
+the reactor runs a timer that should fire every
+`settings.LAG_PROBE_INTERVAL` seconds: with a free reactor that's close
+to 0, and anything blocking the reactor for everyone (a slow command, a
+burst of logins) shows up directly as lag.
+
+    from world.latency import Recorder
+    LOGINS = Recorder("login")
+    LOGINS.add(seconds)
+
+"""
+
+import time
+from collections import deque
+
+from django.conf import settings
+from twisted.internet import task
+
+from world import metrics
+
+_PROBE = None
+# when the lag probe should run next
+_EXPECTED = 0
+
+
+class Recorder:
+    """
+    The most recent samples of a duration, in seconds.
+    """
+
+    def __init__(self, name, size=500):
+        self.name = name
+        self.samples = deque(maxlen=size)
+
+    def add(self, seconds):
+        self.samples.append(seconds)
+
+    def percentile(self, percent):
+        """
+        Returns:
+            seconds (float): The `percent` percentile of the samples, 0 if
+                there are none.
+
+        """
+        if not self.samples:
+            return 0
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100))]
+
+    def stats(self):
+        """
+        Returns:
+            stats (dict): Sample count, median, p99 and maximum, in ms.
+
+        """
+        return {
+            "samples": len(self.samples),
+            "p50 (ms)": round(self.percentile(50) * 1000, 1),
+            "p99 (ms)": round(self.percentile(99) * 1000, 1),
+            "max (ms)": round(max(self.samples, default=0) * 1000, 1),
+        }
+
+
+REACTOR_LAG = Recorder("reactor lag")
+
+
+def _probe():
+    global _EXPECTED
+    now = time.time()
+    REACTOR_LAG.add(max(0, now - _EXPECTED))
+    _EXPECTED = now + settings.LAG_PROBE_INTERVAL
+
+
+def start():
+    """
+    Start probing reactor lag. Called at server start.
+    """
+    global _PROBE, _EXPECTED
+    if _PROBE is None:
+        _EXPECTED = time.time() + settings.LAG_PROBE_INTERVAL
+        _PROBE = task.LoopingCall(_probe)
+        _PROBE.start(settings.LAG_PROBE_INTERVAL, now=False)
+
+
+def stop():
+    """
+    Stop the lag probe.
+    """
+    global _PROBE
+    if _PROBE is not None and _PROBE.running:
+        _PROBE.stop()
+    _PROBE = None
+
+
+metrics.register("reactor lag", REACTOR_LAG.stats)
@@ -0,0 +1,82 @@
+"""
+Lock caching
+
+Evennia parses a lockstring every time an object's LockHandler is set
+up and on every `check_lockstring` call. Most of our objects share the
+same handful of default lockstrings, so `CachedLockHandler` keeps the
+parsed result of each distinct lockstring and hands out copies of it
+instead of parsing again. Typeclasses use it through their `locks`
+property.
+
+Use `benchmark` from `py` in-game to compare the per-check cost with
+and without the cache:
+
+    py from world.locks import benchmark; self.msg(benchmark(self, here.contents[0]))
+
+"""
+
+import time
+
+from django.conf import settings
+from evennia.locks.lockhandler import LockHandler
+
+from world import metrics
+
+_PARSED = {}
+_STATS = {"hits": 0, "misses": 0}
+
+
+class CachedLockHandler(LockHandler):
+    """
+    A LockHandler that parses each distinct lockstring only once.
+    """
+
+    def _parse_lockstring(self, storage_lockstring):
+        try:
+            parsed = _PARSED[storage_lockstring]
+            _STATS["hits"] += 1
+        except KeyError:
+            _STATS["misses"] += 1
+            parsed = super()._parse_lockstring(storage_lockstring)
+            if len(_PARSED) >= settings.LOCK_CACHE_SIZE:
+                _PARSED.clear()
+            _PARSED[storage_lockstring] = parsed
+        # handlers change their own dict when locks are added or removed
+        return dict(parsed)
+
+
+def benchmark(accessing_obj, accessed_obj, access_type="get", iterations=10000):
+    """
+    Time lock checks on an object with a plain and a caching LockHandler.
+    Both reparse the object's lockstring before every check, which is
+    what happens whenever an object is loaded or checked with
+    `check_lockstring`.
+
+    Args:
+        accessing_obj (Object): The object asking for access.
+        accessed_obj (Object): The object whose locks are checked.
+        access_type (str, optional): The access type to check.
+        iterations (int, optional): Number of checks to time.
+
+    Returns:
+        result (str): Microseconds per check, before and after.
+
+    """
+    lockstring = accessed_obj.lock_storage
+    timings = {}
+    for name, handler_class in (("plain", LockHandler), ("cached", CachedLockHandler)):
+        handler = handler_class(accessed_obj)
+        start = time.perf_counter()
+        for _ in range(iterations):
+            handler._cache_locks(lockstring)
+            handler.check(accessing_obj, access_type, no_superuser_bypass=True)
+        timings[name] = (time.perf_counter() - start) / iterations * 1e6
+    return "%s on %s: plain %.1fus/check, cached %.1fus/check" % (
+        access_type,
+        accessed_obj,
+        timings["plain"],
+        timings["cached"],
+    )
+
+
+metrics.register("lock cache", lambda: dict(_STATS, lockstrings=len(_PARSED)))
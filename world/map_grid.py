@@ -0,0 +1,79 @@
+"""
+Map grid
+
+A compact grid for the `map` command. Cells are stored as one byte
+each in a `bytearray` and only turned into glyphs when the rows are
+rendered, so building a map costs a single allocation regardless of
+its size.
+
+    grid = MapGrid(x, y, 3)
+    grid.mark_room(x + 1, y)
+    for row in grid.rows():
+        caller.msg(row)
+
+"""
+
+EMPTY = 0
+ROOM = 1
+HERE = 2
+
+GLYPHS = (" · ", " ■ ", " # ")
+
+
+class MapGrid:
+    """
+    A square map of everything within `dist` of a center coordinate.
+    The center is marked as the viewer's position.
+    """
+
+    __slots__ = ("x", "y", "dist", "width", "cells")
+
+    def __init__(self, x, y, dist):
+        self.x = x
+        self.y = y
+        self.dist = dist
+        self.width = dist * 2 + 1
+        self.cells = bytearray(self.width * self.width)
+        self.cells[dist * self.width + dist] = HERE
+
+    def _index(self, x, y):
+        col = x - self.x + self.dist
+        row = y - self.y + self.dist
+        if 0 <= col < self.width and 0 <= row < self.width:
+            return row * self.width + col
+        return None
+
+    def mark_room(self, x, y):
+        """
+        Mark that there is a room at (x, y). Coordinates outside the grid
+        and the center cell are ignored.
+        """
+        index = self._index(x, y)
+        if index is not None and self.cells[index] != HERE:
+            self.cells[index] = ROOM
+
+    def cell(self, x, y):
+        """
+        Returns:
+            cell (int or None): EMPTY, ROOM or HERE, or None if (x, y) is
+                outside the grid.
+
+        """
+        index = self._index(x, y)
+        return self.cells[index] if index is not None else None
+
+    def rows(self):
+        """
+        Returns:
+            rows (list): The rendered rows of the map, north first.
+
+        """
+        width = self.width
+        cells = self.cells
+        return [
+            "".join([GLYPHS[cell] for cell in cells[start : start + width]])
+            for start in range(0, len(cells), width)
+        ]
+
+    def __iter__(self):
+        return iter(self.rows())
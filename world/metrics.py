@@ -0,0 +1,48 @@
+"""
+Metrics
+
+A tiny registry of runtime statistics. Game systems that keep their own
+counters (thread pools, caches, sessions etc) register a provider here:
+a callable taking no arguments and returning a flat dict of values.
+The `metrics` admin command collects and shows them all.
+
+    from world import metrics
+    metrics.register("query pool", pool_stats)
+
+"""
+
+_PROVIDERS = {}
+
+
+def register(name, provider):
+    """
+    Register a statistics provider.
+
+    Args:
+        name (str): Section name to show the statistics under.
+        provider (callable): Called without arguments, returns a dict.
+
+    """
+    _PROVIDERS[name] = provider
+
+
+def unregister(name):
+    """
+    Remove a previously registered provider, if any.
+
+    Args:
+        name (str): The section name the provider was registered with.
+
+    """
+    _PROVIDERS.pop(name, None)
+
+
+def collect():
+    """
+    Gather the current statistics from all providers.
+
+    Returns:
+        stats (dict): `{section: {key: value}}`, sorted by section name.
+
+    """
+    return {name: dict(_PROVIDERS[name]()) for name in sorted(_PROVIDERS)}
@@ -48,43 +48,42 @@ See the `spawn` command and `evennia.prototypes.spawner.spawn` for more info.
 
 """
 
-## example of module-based prototypes using
-## the variable name as `prototype_key` and
-## simple Attributes
+# Our prototypes leave `desc` and the senses unset: those are written by
+# players, once. Spawn them in bulk with world/spawning.py.
 
-# from random import randint
-#
-# GOBLIN = {
-# "key": "goblin grunt",
-# "health": lambda: randint(20,30),
-# "resists": ["cold", "poison"],
-# "attacks": ["fists"],
-# "weaknesses": ["fire", "light"],
-# "tags": = [("greenskin", "monster"), ("humanoid", "monster")]
-# }
-#
-# GOBLIN_WIZARD = {
-# "prototype_parent": "GOBLIN",
-# "key": "goblin wizard",
-# "spells": ["fire ball", "lighting bolt"]
-# }
-#
-# GOBLIN_ARCHER = {
-# "prototype_parent": "GOBLIN",
-# "key": "goblin archer",
-# "attacks": ["short bow"]
-# }
-#
-# This is an example of a prototype without a prototype
-# (nor key) of its own, so it should normally only be
-# used as a mix-in, as in the example of the goblin
-# archwizard below.
-# ARCHWIZARD_MIXIN = {
-# "attacks": ["archwizard staff"],
-# "spells": ["greater fire ball", "greater lighting"]
-# }
-#
-# GOBLIN_ARCHWIZARD = {
-# "key": "goblin archwizard",
-# "prototype_parent" : ("GOBLIN_WIZARD", "ARCHWIZARD_MIXIN")
-# }
+ITEM = {
+    "prototype_key": "item",
+    "prototype_desc": "Something that can be picked up and described.",
+    "prototype_tags": ["item"],
+    "typeclass": "typeclasses.items.Item",
+    "key": "thing",
+}
+
+ROOM = {
+    "prototype_key": "room",
+    "prototype_desc": "A room off the coordinate grid.",
+    "prototype_tags": ["room"],
+    "typeclass": "typeclasses.rooms.Room",
+    "key": "empty room",
+}
+
+EXIT = {
+    "prototype_key": "exit",
+    "prototype_desc": "An exit; give it a location and destination when spawning.",
+    "prototype_tags": ["exit"],
+    "typeclass": "typeclasses.exits.Exit",
+    "key": "passage",
+}
+
+PEBBLE = {
+    "prototype_parent": "item",
+    "prototype_key": "pebble",
+    "key": "pebble",
+    "aliases": ["stone"],
+}
+
+FEATHER = {
+    "prototype_parent": "item",
+    "prototype_key": "feather",
+    "key": "feather",
+}
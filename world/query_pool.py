@@ -0,0 +1,115 @@
+"""
+Query pool
+
+Heavy world queries (coordinate lookups, map scans) are run in a small,
+bounded thread pool so that a slow query doesn't stall the reactor and
+with it every connected player.
+
+Use `defer_query` to run a function in the pool. It returns a Deferred
+firing with the function's return value. If too many queries are
+already waiting, the Deferred fails right away with `QueryPoolFull`
+instead of queueing more work - callers should tell the player to try
+again rather than pile up requests.
+
+Functions run in the pool must only touch the database and return plain
+data; anything that messages players or changes typeclassed objects
+belongs in a callback, which runs back on the reactor thread.
+
+"""
+
+from django.conf import settings
+from django.db import close_old_connections
+from twisted.internet import defer, reactor
+from twisted.internet.threads import deferToThreadPool
+from twisted.python.failure import Failure
+from twisted.python.threadpool import ThreadPool
+
+from world import metrics
+
+_POOL = None
+
+_STATS = {
+    "pending": 0,
+    "peak pending": 0,
+    "completed": 0,
+    "failed": 0,
+    "rejected": 0,
+}
+
+
+class QueryPoolFull(Exception):
+    """
+    Raised (as a failed Deferred) when the pool already has
+    `settings.QUERY_POOL_MAX_PENDING` queries waiting.
+    """
+
+    pass
+
+
+def _get_pool():
+    global _POOL
+    if _POOL is None:
+        _POOL = ThreadPool(
+            minthreads=1, maxthreads=settings.QUERY_POOL_THREADS, name="world-queries"
+        )
+        _POOL.start()
+        reactor.addSystemEventTrigger("during", "shutdown", _POOL.stop)
+    return _POOL
+
+
+def _run_in_thread(func, args, kwargs):
+    try:
+        return func(*args, **kwargs)
+    finally:
+        # worker threads keep their own db connection; drop it if it went stale
+        close_old_connections()
+
+
+def _finished(result):
+    _STATS["pending"] -= 1
+    if isinstance(result, Failure):
+        _STATS["failed"] += 1
+    else:
+        _STATS["completed"] += 1
+    return result
+
+
+def defer_query(func, *args, **kwargs):
+    """
+    Run a database query function in the query pool.
+
+    Args:
+        func (callable): The function to run. It is called in a worker
+            thread and should return plain data, not typeclassed objects.
+        *args, **kwargs: Passed on to `func`.
+
+    Returns:
+        deferred (Deferred): Fires with the return of `func`, or fails
+            with `QueryPoolFull` if the pool is saturated.
+
+    """
+    if _STATS["pending"] >= settings.QUERY_POOL_MAX_PENDING:
+        _STATS["rejected"] += 1
+        return defer.fail(QueryPoolFull("Too many world queries are waiting."))
+
+    _STATS["pending"] += 1
+    _STATS["peak pending"] = max(_STATS["peak pending"], _STATS["pending"])
+    deferred = deferToThreadPool(reactor, _get_pool(), _run_in_thread, func, args, kwargs)
+    deferred.addBoth(_finished)
+    return deferred
+
+
+def pool_stats():
+    """
+    Returns:
+        stats (dict): Queue depth and counters for the query pool.
+
+    """
+    stats = dict(_STATS)
+    if _POOL is not None:
+        stats["threads busy"] = len(_POOL.working)
+        stats["threads idle"] = len(_POOL.waiters)
+    return stats
+
+
+metrics.register("query pool", pool_stats)
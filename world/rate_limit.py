@@ -0,0 +1,126 @@
+"""
+Rate limiting
+
+Every account (or, before logging in, every session) has a token
+bucket holding at most `settings.RATE_LIMIT_BURST` tokens and refilling
+at `settings.RATE_LIMIT_RATE` tokens per second. Each command typed
+costs tokens - `settings.RATE_LIMIT_COSTS` by command name, 1 for
+anything else - so commands that create things in the database can be
+made to cost more than looking around. Input that can't be paid for is
+dropped before it reaches the command handler, and the player is told
+once until they slow down. Answers to a question a command asked (see
+`get_input`) are not commands and cost nothing.
+
+The check is done by the `text` input function in
+server/conf/inputfuncs.py, for everything a client types.
+
+"""
+
+import time
+
+from django.conf import settings
+
+from world import metrics
+
+# bucket key -> [tokens, time of last refill]
+_BUCKETS = {}
+# above this many buckets, full ones are forgotten
+_MAX_BUCKETS = 1024
+# bucket keys that were told they are limited
+_WARNED = set()
+
+_STATS = {"allowed": 0, "rejected": 0}
+# rejections per command name in RATE_LIMIT_COSTS, the rest as "other"
+_REJECTED = {}
+
+
+def command_cost(raw_string):
+    """
+    Returns:
+        cost, cmdname (tuple): The tokens it costs to run the command in
+            `raw_string`, and the command name they were looked up by.
+
+    """
+    cmdname = raw_string.split(None, 1)[0].lower() if raw_string.strip() else ""
+    return settings.RATE_LIMIT_COSTS.get(cmdname, 1), cmdname
+
+
+def _answering(session):
+    """
+    Returns:
+        answering (bool): If the session's character (or account) is
+            waiting for the answer to a `get_input` question.
+
+    """
+    caller = session.puppet or session.account
+    return bool(caller and caller.ndb._getinput)
+
+
+def _prune(now):
+    for key, (tokens, last) in list(_BUCKETS.items()):
+        if tokens + (now - last) * settings.RATE_LIMIT_RATE >= settings.RATE_LIMIT_BURST:
+            del _BUCKETS[key]
+            _WARNED.discard(key)
+
+
+def allow(session, raw_string):
+    """
+    Take the cost of a command from the session's bucket.
+
+    Args:
+        session (Session): The session the input came from.
+        raw_string (str): The input, as typed.
+
+    Returns:
+        allowed (bool): If the command may run. If not, the player has
+            been told (once) that they are sending too fast.
+
+    """
+    account = session.account
+    if account and account.is_superuser:
+        return True
+    if _answering(session):
+        return True
+    key = session.uid or "session %s" % session.sessid
+    cost, cmdname = command_cost(raw_string)
+    now = time.time()
+    try:
+        tokens, last = _BUCKETS[key]
+        tokens = min(settings.RATE_LIMIT_BURST, tokens + (now - last) * settings.RATE_LIMIT_RATE)
+    except KeyError:
+        if len(_BUCKETS) >= _MAX_BUCKETS:
+            _prune(now)
+        tokens = settings.RATE_LIMIT_BURST
+
+    if tokens < cost:
+        _BUCKETS[key] = [tokens, now]
+        _STATS["rejected"] += 1
+        # anything else is whatever the flood consists of; don't keep a
+        # counter per junk word
+        name = cmdname if cmdname in settings.RATE_LIMIT_COSTS else "other"
+        _REJECTED[name] = _REJECTED.get(name, 0) + 1
+        if key not in _WARNED:
+            _WARNED.add(key)
+            session.msg("You're sending commands too fast; slow down a little.")
+        return False
+
+    _BUCKETS[key] = [tokens - cost, now]
+    _WARNED.discard(key)
+    _STATS["allowed"] += 1
+    return True
+
+
+def limiter_stats():
+    """
+    Returns:
+        stats (dict): Allowed and rejected commands, the latter also per
+            command name.
+
+    """
+    stats = dict(_STATS, buckets=len(_BUCKETS), limited=len(_WARNED))
+    for cmdname, count in sorted(_REJECTED.items()):
+        stats["rejected %s" % cmdname] = count
+    return stats
+
+
+metrics.register("rate limit", limiter_stats)
@@ -1,7 +1,8 @@
 from django.conf import settings
 from evennia.utils import create, utils, search, logger
+from world import zones
 
-def create_room(caller, room_name, description=None):
+def create_room(caller, room_name, description=None, coords=None):
     new_room = create.create_object(
         settings.BASE_ROOM_TYPECLASS,
         room_name,
@@ -10,6 +11,12 @@ def create_room(caller, room_name, description=None):
     if description:
         new_room.db.desc = description
 
+    if coords:
+        # setting the coordinates also puts the room in its zone
+        new_room.x, new_room.y = coords
+    else:
+        zones.assign(new_room, zones.zone_name_of(caller.location) or settings.DEFAULT_ZONE)
+
     return new_room
 
 def link(caller, source, target):
@@ -0,0 +1,189 @@
+"""
+Sampling profiler
+
+A profiler that can be switched on in a running server. While it runs,
+a background thread looks at the reactor thread's call stack every
+`settings.PROFILE_INTERVAL` seconds and counts the stacks it sees. That
+costs little enough to use in production, unlike cProfile, which slows
+down every single call.
+
+`stop` writes the counted stacks to a file in the "collapsed" format
+that flamegraph tools read (one `outer;inner;innermost count` line per
+stack), and `hotspots` summarizes them by game function, such as
+`commands.command.CmdMap.func` or `typeclasses.rooms.Room.nearby_rooms`.
+The `profile` command drives it in-game. A run can be given a duration;
+its timer belongs to the run, so stopping the run by hand cancels it.
+
+"""
+
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from twisted.internet import reactor
+
+# top-level packages of the game dir
+GAME_PACKAGES = ("commands", "server", "typeclasses", "world")
+
+# code object -> "module.Class.function"
+_NAMES = {}
+_STACKS = Counter()
+_THREAD = None
+_STOP = None
+_STARTED = 0
+_STOPPED = 0
+# stops a run started with a duration
+_TIMER = None
+
+
+def _defined_in(cls, code):
+    for klass in cls.__mro__:
+        for attr in vars(klass).values():
+            func = getattr(attr, "__wrapped__", attr)
+            if getattr(func, "__code__", None) is code:
+                return klass
+    return None
+
+
+def _name(frame):
+    code = frame.f_code
+    try:
+        return _NAMES[code]
+    except KeyError:
+        pass
+    module = frame.f_globals.get("__name__", "?")
+    name = code.co_name
+    if code.co_argcount and code.co_varnames[0] in ("self", "cls"):
+        owner = frame.f_locals.get(code.co_varnames[0])
+        klass = _defined_in(owner if isinstance(owner, type) else type(owner), code)
+        if klass is not None:
+            name = "%s.%s" % (klass.__qualname__, name)
+    name = _NAMES[code] = "%s.%s" % (module, name)
+    return name
+
+
+def _sample(thread_id, interval, stop):
+    while not stop.wait(interval):
+        frame = sys._current_frames().get(thread_id)
+        stack = []
+        while frame is not None:
+            stack.append(_name(frame))
+            frame = frame.f_back
+        if stack:
+            _STACKS[tuple(reversed(stack))] += 1
+
+
+def is_running():
+    """
+    Returns:
+        running (bool): If the profiler is sampling.
+
+    """
+    return _THREAD is not None
+
+
+def _timed_out(callback):
+    global _TIMER
+    _TIMER = None
+    filename = stop()
+    if callback:
+        callback(filename)
+
+
+def start(thread_id=None, duration=None, callback=None):
+    """
+    Start sampling a thread's stack.
+
+    Args:
+        thread_id (int, optional): The thread to sample; the calling
+            thread (normally the reactor) by default.
+        duration (float, optional): Stop by itself after this many
+            seconds, unless stopped before.
+        callback (callable, optional): Called with the return of `stop`
+            when the run stops by itself.
+
+    """
+    global _THREAD, _STOP, _STARTED, _TIMER
+    if _THREAD is not None:
+        return
+    _STACKS.clear()
+    _STARTED = time.time()
+    _STOP = threading.Event()
+    _THREAD = threading.Thread(
+        target=_sample,
+        args=(thread_id or threading.get_ident(), settings.PROFILE_INTERVAL, _STOP),
+        name="sampling-profiler",
+        daemon=True,
+    )
+    _THREAD.start()
+    if duration:
+        _TIMER = reactor.callLater(duration, _timed_out, callback)
+
+
+def stop():
+    """
+    Stop sampling and write the collapsed stacks to a file.
+
+    Returns:
+        filename (str or None): The file written, if anything was sampled.
+
+    """
+    global _THREAD, _STOPPED, _TIMER
+    if _THREAD is None:
+        return None
+    if _TIMER is not None and _TIMER.active():
+        _TIMER.cancel()
+    _TIMER = None
+    _STOP.set()
+    _THREAD.join()
+    _THREAD = None
+    _STOPPED = time.time()
+    if not _STACKS:
+        return None
+    filename = os.path.join(
+        settings.LOG_DIR, time.strftime("profile-%Y%m%d-%H%M%S.folded", time.localtime(_STARTED))
+    )
+    with open(filename, "w") as folded:
+        for stack, count in _STACKS.most_common():
+            folded.write("%s %i\n" % (";".join(stack), count))
+    return filename
+
+
+def hotspots(top=10):
+    """
+    Summarize the samples by game function.
+
+    Args:
+        top (int, optional): How many functions to list.
+
+    Returns:
+        lines (list): Game functions by share of samples, inclusive (the
+            function or something it called was running) and self (it was
+            the innermost game function on the stack).
+
+    """
+    total = sum(_STACKS.values())
+    if not total:
+        return ["No samples."]
+    inclusive, own = Counter(), Counter()
+    for stack, count in _STACKS.items():
+        game = [name for name in stack if name.split(".", 1)[0] in GAME_PACKAGES]
+        if game:
+            own[game[-1]] += count
+            for name in set(game):
+                inclusive[name] += count
+
+    end = time.time() if _THREAD is not None else _STOPPED
+    outside = total - sum(own.values())
+    lines = [
+        "%i samples over %.1fs, %.1f%% outside game code (mostly idle)."
+        % (total, end - _STARTED, 100.0 * outside / total)
+    ]
+    for title, counts in (("Inclusive:", inclusive), ("Self:", own)):
+        lines.append(title)
+        for name, count in counts.most_common(top):
+            lines.append("  %5.1f%%  %s" % (100.0 * count / total, name))
+    return lines
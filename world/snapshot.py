@@ -0,0 +1,145 @@
+"""
+Reload snapshot
+
+In-memory structures derived from the database (such as the coordinate
+index) are lost on every reload and would have to be rebuilt from the
+database. Instead, `save` writes them to `settings.SNAPSHOT_FILE` just
+before the reload and `restore` loads them back when the server comes
+up again.
+
+Structures take part by registering a dump and a load function:
+
+    snapshot.register("coord index", dump, load)
+
+`dump()` returns picklable data, or None to leave the structure out
+(e.g. because it isn't complete). `load(data)` replaces the structure's
+contents with the dumped data.
+
+The file starts with a header line holding a format version, the time
+it was written and a checksum of the payload. If any of these don't
+match, the snapshot is ignored and the structures are left to be
+rebuilt the normal way (see world/warmup.py). A snapshot is only used
+once; it is removed after reading.
+
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import time
+
+from django.conf import settings
+from evennia.utils import logger
+
+from world import metrics
+
+# bump this whenever the dumped data of any structure changes shape
+SNAPSHOT_VERSION = 1
+
+_STRUCTURES = {}
+
+# seconds from saving the last snapshot to restoring it: how long the
+# reload kept the game down
+_STATS = {"last reload (s)": None}
+
+
+def register(name, dump, load):
+    """
+    Register a structure to be saved over reloads.
+
+    Args:
+        name (str): Unique name of the structure.
+        dump (callable): Returns picklable data, or None to skip.
+        load (callable): Called with the dumped data to restore it.
+
+    """
+    _STRUCTURES[name] = (dump, load)
+
+
+def save():
+    """
+    Write all registered structures to the snapshot file.
+    """
+    start = time.time()
+    data = {}
+    for name, (dump, _) in _STRUCTURES.items():
+        try:
+            dumped = dump()
+        except Exception:
+            logger.log_trace("Snapshot: could not dump %s." % name)
+            continue
+        if dumped is not None:
+            data[name] = dumped
+
+    payload = pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)
+    header = {
+        "version": SNAPSHOT_VERSION,
+        "written": time.time(),
+        "checksum": hashlib.sha256(payload).hexdigest(),
+    }
+    tmpfile = settings.SNAPSHOT_FILE + ".tmp"
+    with open(tmpfile, "wb") as snapshot:
+        snapshot.write(json.dumps(header).encode("utf-8") + b"\n")
+        snapshot.write(payload)
+    os.replace(tmpfile, settings.SNAPSHOT_FILE)
+    logger.log_info(
+        "Snapshot: saved %s in %.3fs." % (", ".join(sorted(data)) or "nothing", time.time() - start)
+    )
+
+
+def _read():
+    with open(settings.SNAPSHOT_FILE, "rb") as snapshot:
+        header = json.loads(snapshot.readline().decode("utf-8"))
+        payload = snapshot.read()
+
+    if header.get("version") != SNAPSHOT_VERSION:
+        raise ValueError("version %s, expected %s" % (header.get("version"), SNAPSHOT_VERSION))
+    if time.time() - header.get("written", 0) > settings.SNAPSHOT_MAX_AGE:
+        raise ValueError("snapshot is older than %s seconds" % settings.SNAPSHOT_MAX_AGE)
+    if hashlib.sha256(payload).hexdigest() != header.get("checksum"):
+        raise ValueError("checksum mismatch")
+    return header, pickle.loads(payload)
+
+
+def restore():
+    """
+    Load the snapshot file, if there is a valid one, into the registered
+    structures.
+
+    Returns:
+        restored (list): Names of the structures that were restored.
+
+    """
+    if not os.path.exists(settings.SNAPSHOT_FILE):
+        return []
+
+    start = time.time()
+    try:
+        header, data = _read()
+        _STATS["last reload (s)"] = round(start - header["written"], 2)
+    except Exception as err:
+        logger.log_warn("Snapshot: ignoring %s (%s), rebuilding." % (settings.SNAPSHOT_FILE, err))
+        data = {}
+    finally:
+        os.remove(settings.SNAPSHOT_FILE)
+
+    restored = []
+    for name, dumped in data.items():
+        if name not in _STRUCTURES:
+            continue
+        try:
+            _STRUCTURES[name][1](dumped)
+        except Exception:
+            logger.log_trace("Snapshot: could not restore %s, rebuilding." % name)
+            continue
+        restored.append(name)
+
+    if restored:
+        logger.log_info(
+            "Snapshot: restored %s in %.3fs." % (", ".join(sorted(restored)), time.time() - start)
+        )
+    return restored
+
+
+metrics.register("reload", lambda: dict(_STATS))
@@ -0,0 +1,153 @@
+"""
+Bulk spawning
+
+`evennia.prototypes.spawner.spawn` looks up every prototype there is
+(module and database ones) and walks the `prototype_parent` chain on
+each call, and saves each new object in its own transaction. That is
+fine for one sword, but events and load tests need thousands of items.
+
+`flatten` resolves a prototype and its parents once and keeps the
+flattened dict. Spawning turns it into the create arguments of a single
+object once (`spawn` with `only_validate`), and then creates all copies
+from those with `batch_create_object`, so prototypes are neither looked
+up nor validated again per object. `bulk_spawn` does that in batches of
+`settings.SPAWN_BATCH_SIZE` objects, each batch in one transaction and
+one cooperator step so the server keeps running in between.
+
+    from world import spawning
+    spawning.bulk_spawn("pebble", 5000, location=here)
+
+Call `forget` after changing a prototype in the database.
+
+"""
+
+import copy
+import time
+
+from django.conf import settings
+from django.db import transaction
+from evennia.prototypes import prototypes as protlib
+from evennia.prototypes.spawner import batch_create_object, flatten_prototype, spawn
+from evennia.utils import logger
+from twisted.internet import task
+
+from world import metrics
+
+# prototype key -> flattened prototype
+_FLAT = {}
+
+_STATS = {"spawned": 0, "batches": 0, "last rate (objects/s)": 0}
+
+
+def flatten(prototype_key):
+    """
+    Returns:
+        prototype (dict): The prototype with all its parents merged in,
+            ready to spawn. Don't change it; it's shared.
+
+    Raises:
+        KeyError: If there is no (single) prototype with this key.
+
+    """
+    prototype_key = prototype_key.lower()
+    try:
+        return _FLAT[prototype_key]
+    except KeyError:
+        pass
+    found = protlib.search_prototype(prototype_key, require_single=True)
+    if not found:
+        raise KeyError("No prototype '%s'." % prototype_key)
+    flat = flatten_prototype(found[0])
+    # the parents are merged in; don't have spawn walk them again
+    flat.pop("prototype_parent", None)
+    _FLAT[prototype_key] = flat
+    return flat
+
+
+def forget(prototype_key=None):
+    """
+    Drop a flattened prototype (or all of them) so it's resolved again.
+    """
+    if prototype_key is None:
+        _FLAT.clear()
+    else:
+        _FLAT.pop(prototype_key.lower(), None)
+
+
+def _objparams(prototype_key, overrides):
+    """
+    Returns:
+        objparams (tuple): The arguments `batch_create_object` takes for
+            one object spawned from the prototype.
+
+    """
+    prototype = dict(flatten(prototype_key), **overrides)
+    return spawn(prototype, only_validate=True)[0]
+
+
+def spawn_batch(prototype_key, count, objparams=None, **overrides):
+    """
+    Spawn `count` objects from a prototype in a single transaction.
+
+    Args:
+        prototype_key (str): The prototype to spawn.
+        count (int): How many objects.
+        objparams (tuple, optional): The create arguments from an
+            earlier batch of the same spawn, to skip resolving them again.
+        **overrides: Prototype keys to set on all of them, such as
+            `location`.
+
+    Returns:
+        objects (list): The new objects.
+
+    """
+    if objparams is None:
+        objparams = _objparams(prototype_key, overrides)
+    # each object gets its own copies of the argument dicts and lists
+    batch = [tuple(copy.copy(part) for part in objparams) for _ in range(count)]
+    with transaction.atomic():
+        objs = batch_create_object(*batch)
+    _STATS["spawned"] += len(objs)
+    _STATS["batches"] += 1
+    return objs
+
+
+def _run(prototype_key, count, overrides, spawned):
+    start = time.time()
+    batch_size = settings.SPAWN_BATCH_SIZE
+    objparams = _objparams(prototype_key, overrides)
+    for offset in range(0, count, batch_size):
+        spawned.extend(
+            spawn_batch(prototype_key, min(batch_size, count - offset), objparams, **overrides)
+        )
+        yield
+    seconds = time.time() - start
+    _STATS["last rate (objects/s)"] = int(len(spawned) / seconds) if seconds else len(spawned)
+    logger.log_info("Spawned %i %s in %.2fs." % (len(spawned), prototype_key, seconds))
+
+
+def bulk_spawn(prototype_key, count, **overrides):
+    """
+    Spawn many objects from a prototype in the background.
+
+    Args:
+        prototype_key (str): The prototype to spawn.
+        count (int): How many objects.
+        **overrides: Prototype keys to set on all of them, such as
+            `location`.
+
+    Returns:
+        deferred (Deferred): Fires with the list of new objects.
+
+    """
+    # fail here rather than in the cooperator if the prototype is unknown
+    flatten(prototype_key)
+    spawned = []
+    return (
+        task.cooperate(_run(prototype_key, count, overrides, spawned))
+        .whenDone()
+        .addCallback(lambda _: spawned)
+    )
+
+
+metrics.register("spawning", lambda: dict(_STATS, **{"cached prototypes": len(_FLAT)}))
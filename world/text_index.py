@@ -0,0 +1,325 @@
+"""
+Text index
+
+An in-memory inverted index over the texts players write: descriptions
+and senses (`settings.TEXT_INDEX_ATTRIBUTES`). It maps every word to
+the (object id, Attribute key) pairs whose text contains it, so a search
+intersects a few sets instead of scanning the Attribute table with
+`LIKE '%...%'`.
+
+Words are lowercased, common stopwords are skipped and, with
+`settings.TEXT_INDEX_STEMMING`, plural and verb endings are stripped so
+"glowing" finds "glows".
+
+The index is updated as texts are written (see world/write_behind.py)
+and objects are deleted, and saved to `settings.TEXT_INDEX_FILE` every
+`settings.TEXT_INDEX_SAVE_INTERVAL` seconds and at shutdown. If there is
+no saved index at startup it's built from the database in the query
+pool; `rebuild` does the same on demand (the `lookup/rebuild` command).
+A saved index older than the write-behind journal is not used either:
+texts were written after it was saved, and if the server crashed they
+may be in the database but not in the file. If the build fails (e.g.
+the query pool is full) it's tried again on the next periodic save.
+
+    from world import text_index
+    text_index.search("blue glowing stone")
+
+"""
+
+import json
+import os
+import re
+import time
+
+from django.conf import settings
+from evennia.objects.models import ObjectDB
+from evennia.utils import logger
+from twisted.internet import task
+
+from world import metrics
+from world.query_pool import defer_query
+
+INDEX_VERSION = 1
+
+_WORD = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+_STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have in is it its of on or so that the "
+    "their there this to was were with you your".split()
+)
+_SUFFIXES = ("ing", "ed", "es", "ly", "s")
+
+# word -> set of (object id, attribute key)
+_POSTINGS = {}
+# (object id, attribute key) -> words in that text
+_DOCS = {}
+_DIRTY = False
+_LOADED = False
+_BUILDING = False
+# documents added or removed while a rebuild reads the database
+_TOUCHED = set()
+_LOOP = None
+
+_STATS = {"searches": 0, "last search (ms)": 0}
+
+
+def _stem(word):
+    for suffix in _SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            word = word[: -len(suffix)]
+            break
+    if word.endswith("e") and len(word) > 3:
+        word = word[:-1]
+    return word
+
+
+def tokenize(text):
+    """
+    Returns:
+        words (set): The indexed form of the words in `text`.
+
+    """
+    words = set(_WORD.findall(text.lower())) - _STOPWORDS
+    if settings.TEXT_INDEX_STEMMING:
+        words = {_stem(word) for word in words}
+    return words
+
+
+def _add_doc(doc, words):
+    if _BUILDING:
+        _TOUCHED.add(doc)
+    old = _DOCS.pop(doc, ())
+    for word in old:
+        postings = _POSTINGS.get(word)
+        if postings is not None:
+            postings.discard(doc)
+            if not postings:
+                del _POSTINGS[word]
+    if words:
+        _DOCS[doc] = frozenset(words)
+        for word in words:
+            _POSTINGS.setdefault(word, set()).add(doc)
+
+
+def add(obj_id, key, text):
+    """
+    Index (or re-index) one text.
+
+    Args:
+        obj_id (int): Id of the object the text is on.
+        key (str): Attribute key of the text.
+        text (str): The text.
+
+    """
+    global _DIRTY
+    if key not in settings.TEXT_INDEX_ATTRIBUTES or not isinstance(text, str):
+        return
+    _add_doc((obj_id, key), tokenize(text))
+    _DIRTY = True
+
+
+def remove_object(obj_id):
+    """
+    Drop all texts of a deleted object from the index.
+    """
+    global _DIRTY
+    for key in settings.TEXT_INDEX_ATTRIBUTES:
+        if (obj_id, key) in _DOCS:
+            _add_doc((obj_id, key), ())
+            _DIRTY = True
+
+
+def search(text, limit=None):
+    """
+    Find the texts containing all the words in `text`.
+
+    Args:
+        text (str): The words to look for.
+        limit (int, optional): Return at most this many matches.
+
+    Returns:
+        matches (list): `(object id, attribute key)` pairs, newest
+            objects first.
+
+    """
+    start = time.perf_counter()
+    words = tokenize(text)
+    matches = []
+    if words:
+        postings = sorted((_POSTINGS.get(word, set()) for word in words), key=len)
+        found = set(postings[0]).intersection(*postings[1:])
+        matches = sorted(found, reverse=True)[:limit]
+    _STATS["searches"] += 1
+    _STATS["last search (ms)"] = round((time.perf_counter() - start) * 1000, 2)
+    return matches
+
+
+def save(force=False):
+    """
+    Write the index to `settings.TEXT_INDEX_FILE` if it changed.
+
+    Args:
+        force (bool, optional): Write it even if it didn't, so the file
+            is newer than the write-behind journal.
+
+    """
+    global _DIRTY
+    if not _LOADED or not (_DIRTY or force):
+        return
+    data = {
+        "version": INDEX_VERSION,
+        "stemming": settings.TEXT_INDEX_STEMMING,
+        "docs": [[obj_id, key, sorted(words)] for (obj_id, key), words in _DOCS.items()],
+    }
+    tmpfile = settings.TEXT_INDEX_FILE + ".tmp"
+    try:
+        with open(tmpfile, "w") as indexfile:
+            json.dump(data, indexfile)
+        os.replace(tmpfile, settings.TEXT_INDEX_FILE)
+    except OSError:
+        logger.log_trace("Could not save the text index.")
+        return
+    _DIRTY = False
+
+
+def _read_file():
+    try:
+        stale = os.path.getmtime(settings.WRITE_BEHIND_JOURNAL) > os.path.getmtime(
+            settings.TEXT_INDEX_FILE
+        )
+    except OSError:
+        # no journal, nothing written since
+        stale = False
+    if stale:
+        raise ValueError("texts were written after the index was saved")
+    with open(settings.TEXT_INDEX_FILE) as indexfile:
+        data = json.load(indexfile)
+    if data.get("version") != INDEX_VERSION or data.get("stemming") != settings.TEXT_INDEX_STEMMING:
+        raise ValueError("index was saved with different settings")
+    return [(obj_id, key, words) for obj_id, key, words in data["docs"]]
+
+
+def _texts_from_db():
+    """
+    Tokenize all indexed Attributes in the database. Runs in the query pool.
+    """
+    texts = ObjectDB.db_attributes.through.objects.filter(
+        attribute__db_key__in=settings.TEXT_INDEX_ATTRIBUTES,
+        attribute__db_category__isnull=True,
+    ).values_list("objectdb_id", "attribute__db_key", "attribute__db_value")
+    return [
+        (obj_id, key, tokenize(value))
+        for obj_id, key, value in texts.iterator()
+        if isinstance(value, str)
+    ]
+
+
+def _install(docs, newer=None):
+    """
+    Load documents from the file or database. Texts indexed while loading
+    are newer and are kept.
+
+    Args:
+        docs (list): (object id, key, words) of each document.
+        newer (set, optional): Documents indexed or removed since the
+            loading started, which `docs` must not overwrite. Defaults
+            to the documents in the index.
+
+    """
+    global _LOADED, _DIRTY
+    newer = set(_DOCS) if newer is None else newer
+    for obj_id, key, words in docs:
+        if (obj_id, key) not in newer:
+            _add_doc((obj_id, key), words)
+    _LOADED = True
+    _DIRTY = True
+    logger.log_info("Text index: %i texts, %i words." % (len(_DOCS), len(_POSTINGS)))
+
+
+def rebuild():
+    """
+    Rebuild the index from the database, in the query pool.
+
+    Returns:
+        deferred (Deferred): Fires when the new index is in place, or
+            fails (e.g. with `QueryPoolFull`) leaving the old one in use.
+
+    """
+    global _LOADED, _BUILDING
+    was_loaded = _LOADED
+
+    def _replace(docs):
+        global _BUILDING
+        _BUILDING = False
+        touched = set(_TOUCHED)
+        _TOUCHED.clear()
+        # what was written (e.g. by the write-behind, not flushed yet) or
+        # deleted while the database was read is newer than the read
+        kept = {doc: _DOCS[doc] for doc in touched if doc in _DOCS}
+        _POSTINGS.clear()
+        _DOCS.clear()
+        for doc, words in kept.items():
+            _add_doc(doc, words)
+        _install(docs, touched)
+
+    def _failed(failure):
+        global _LOADED, _BUILDING
+        _BUILDING = False
+        _TOUCHED.clear()
+        _LOADED = was_loaded
+        return failure
+
+    _LOADED = False
+    _BUILDING = True
+    return defer_query(_texts_from_db).addCallbacks(_replace, _failed)
+
+
+def _build():
+    rebuild().addErrback(lambda failure: logger.log_err("Text index build failed: %s" % failure))
+
+
+def _periodic():
+    if _LOADED:
+        save()
+    elif not _BUILDING:
+        _build()
+
+
+def is_ready():
+    """
+    Returns:
+        ready (bool): If the index has been loaded and covers all texts.
+
+    """
+    return _LOADED
+
+
+def start():
+    """
+    Load the saved index, or build it, and start saving it periodically.
+    Called at server start.
+    """
+    global _LOOP
+    if not _LOADED:
+        try:
+            _install(_read_file())
+        except (OSError, ValueError, KeyError):
+            _build()
+    if _LOOP is None:
+        _LOOP = task.LoopingCall(_periodic)
+        _LOOP.start(settings.TEXT_INDEX_SAVE_INTERVAL, now=False)
+
+
+def stop():
+    """
+    Stop saving periodically and save now.
+    """
+    global _LOOP
+    if _LOOP is not None and _LOOP.running:
+        _LOOP.stop()
+    _LOOP = None
+    save(force=True)
+
+
+metrics.register(
+    "text index", lambda: dict(_STATS, texts=len(_DOCS), words=len(_POSTINGS), ready=_LOADED)
+)
@@ -0,0 +1,169 @@
+"""
+Startup warmup
+
+After a restart every room, exit and Attribute has to be fetched from
+the database the first time someone touches it, so the first players in
+pay for cold caches. `start` loads them in bulk instead: rooms (filling
+the coordinate and zone indexes as it goes, unless it was restored from the reload
+snapshot), then the exits of those rooms, priming the Attribute cache of
+each batch with the keys in `settings.WARMUP_ATTRIBUTES`. Only as many
+rooms are loaded as the world cache keeps resident (see
+world/world_cache.py); the indexes always cover all of them.
+
+The work is split into batches of `settings.WARMUP_BATCH_SIZE` objects
+and run through a Twisted cooperator, so the server keeps accepting
+connections and running commands while the warmup continues. Timings
+are written to the server log and shown by the `metrics` command.
+
+"""
+
+import time
+
+from django.conf import settings
+from evennia.objects.models import ObjectDB
+from evennia.utils import logger
+from twisted.internet import task
+
+from world import coord_index, metrics, zones
+
+_STATS = {"state": "not started", "rooms": 0, "exits": 0, "attributes": 0, "seconds": 0.0}
+
+
+def _id_batches(queryset):
+    """
+    Yield successive batches of ids from a queryset, in id order.
+    """
+    last_id = 0
+    while True:
+        batch = list(
+            queryset.filter(id__gt=last_id)
+            .order_by("id")
+            .values_list("id", flat=True)[: settings.WARMUP_BATCH_SIZE]
+        )
+        if not batch:
+            return
+        last_id = batch[-1]
+        yield batch
+
+
+def _index_rooms(room_ids):
+    """
+    Load coordinates and zones of a batch of rooms into their indexes.
+    """
+    tags = {}
+    room_tags = ObjectDB.db_tags.through.objects.filter(
+        objectdb_id__in=room_ids,
+        tag__db_category__in=("coordx", "coordy", "zone"),
+    ).values_list("objectdb_id", "tag__db_key", "tag__db_category")
+    for room_id, key, category in room_tags:
+        tags.setdefault(room_id, {})[category] = key
+    for room_id in room_ids:
+        room_tags = tags.get(room_id, {})
+        x, y = room_tags.get("coordx"), room_tags.get("coordy")
+        x, y = (int(x), int(y)) if x is not None and y is not None else (None, None)
+        coord_index.update(room_id, x, y)
+        zone = room_tags.get("zone")
+        if zone is None:
+            # rooms built before zones existed
+            zone = zones.zone_name_for(x, y) if x is not None else settings.DEFAULT_ZONE
+        zones.index_room(room_id, zone)
+
+
+def _cache_attribute(obj, key, attr):
+    # never overwrite what's already cached, such as an unsaved write-behind value
+    handler = obj.attributes
+    if "%s-None" % key not in handler._cache:
+        handler._setcache(key, None, attr)
+
+
+def _prime_attributes(objs):
+    """
+    Load the warmup Attributes of a batch of objects in one query and put
+    them in each object's Attribute cache. Attributes an object doesn't
+    have are cached as missing, which saves the query for those too.
+    """
+    keys = settings.WARMUP_ATTRIBUTES
+    by_id = {obj.id: obj for obj in objs}
+    found = set()
+    rows = ObjectDB.db_attributes.through.objects.filter(
+        objectdb_id__in=list(by_id),
+        attribute__db_key__in=keys,
+        attribute__db_category__isnull=True,
+    ).select_related("attribute")
+    for row in rows:
+        found.add((row.objectdb_id, row.attribute.db_key))
+        _cache_attribute(by_id[row.objectdb_id], row.attribute.db_key, row.attribute)
+    for obj_id, obj in by_id.items():
+        for key in keys:
+            if (obj_id, key) not in found:
+                _cache_attribute(obj, key, None)
+    _STATS["attributes"] += len(found)
+
+
+def _run():
+    start = time.time()
+    _STATS["state"] = "running"
+
+    phase_start = time.time()
+    rooms = ObjectDB.objects.filter(db_typeclass_path=settings.BASE_ROOM_TYPECLASS)
+    loaded_room_ids = []
+    for room_ids in _id_batches(rooms):
+        # the indexes may already be complete from the reload snapshot
+        if not (coord_index.is_ready() and zones.is_ready()):
+            _index_rooms(room_ids)
+        # only load as many rooms as the world cache will keep resident
+        if len(loaded_room_ids) < settings.WORLD_CACHE_MAX_ROOMS:
+            # loading them is enough to put them in the idmapper cache
+            _prime_attributes(list(ObjectDB.objects.filter(id__in=room_ids)))
+            loaded_room_ids.extend(room_ids)
+        _STATS["rooms"] += len(room_ids)
+        yield
+    coord_index.mark_ready()
+    zones.mark_ready()
+    logger.log_info(
+        "Warmup: %i rooms (%i loaded), %i coordinates in %.2fs."
+        % (_STATS["rooms"], len(loaded_room_ids), coord_index.size(), time.time() - phase_start)
+    )
+
+    phase_start = time.time()
+    batch_size = settings.WARMUP_BATCH_SIZE
+    for start_index in range(0, len(loaded_room_ids), batch_size):
+        exits = list(
+            ObjectDB.objects.filter(
+                db_typeclass_path=settings.BASE_EXIT_TYPECLASS,
+                db_location_id__in=loaded_room_ids[start_index : start_index + batch_size],
+            )
+        )
+        _prime_attributes(exits)
+        _STATS["exits"] += len(exits)
+        yield
+    logger.log_info("Warmup: %i exits in %.2fs." % (_STATS["exits"], time.time() - phase_start))
+
+    _STATS["seconds"] = round(time.time() - start, 2)
+    _STATS["state"] = "done"
+    logger.log_info(
+        "Warmup finished in %.2fs (%i attributes cached)."
+        % (_STATS["seconds"], _STATS["attributes"])
+    )
+
+
+def _failed(failure):
+    _STATS["state"] = "failed"
+    logger.log_err("Warmup failed: %s" % failure.getTraceback())
+
+
+def start():
+    """
+    Start the warmup in the background, if enabled in settings.
+
+    Returns:
+        deferred (Deferred or None): Fires when the warmup is done.
+
+    """
+    if not settings.WARMUP_ENABLED:
+        _STATS["state"] = "disabled"
+        return None
+    return task.cooperate(_run()).whenDone().addErrback(_failed)
+
+
+metrics.register("warmup", lambda: dict(_STATS))
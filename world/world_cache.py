@@ -0,0 +1,227 @@
+"""
+World cache limits
+
+Evennia's idmapper keeps every object that has been loaded in memory
+until the server restarts, and players keep building new rooms and
+items. This module caps how many rooms stay resident.
+
+Rooms are tracked in least-recently-used order: a room counts as used
+when it is loaded or when it, one of its exits or one of its items has
+its access checked (which happens on look, get, traversal and so on).
+Every `settings.WORLD_CACHE_SWEEP_INTERVAL` seconds, if more than
+`settings.WORLD_CACHE_MAX_ROOMS` rooms are tracked, the least recently
+used ones are dropped from the cache together with their exits and
+items, at most `settings.WORLD_CACHE_SWEEP_BATCH` per sweep. They are
+simply loaded from the database again the next time they're needed.
+
+Rooms that a connected player is standing in or can walk to directly
+are never evicted, nor are rooms with descriptions that are still
+waiting to be saved (see world/write_behind.py).
+
+An object only counts as evicted once it is really gone from the
+idmapper (Evennia refuses to flush some objects, see
+`at_idmapper_flush`). Other cached objects still pointing at an evicted
+one through `location`, `destination` or `home`, like the exits of
+neighbouring rooms, have that reference dropped, so the next access
+loads the same instance everyone else gets instead of keeping a second
+copy alive.
+
+"""
+
+import resource
+from collections import OrderedDict
+from itertools import islice
+
+from django.conf import settings
+from evennia.objects.models import ObjectDB
+from evennia.server.sessionhandler import SESSION_HANDLER
+from evennia.utils.utils import inherits_from
+from twisted.internet import task
+
+from world import appearance, metrics, write_behind
+
+# room id -> None, least recently used first
+_LRU = OrderedDict()
+_LOOP = None
+
+_STATS = {
+    "evicted rooms": 0,
+    "evicted objects": 0,
+    "pinned skips": 0,
+    "refused": 0,
+    "sweeps": 0,
+}
+
+# ObjectDB foreign keys to other objects, whose cached instances must not
+# outlive an eviction
+_OBJECT_FKS = ("db_location", "db_destination", "db_home")
+
+
+def touch_room(room_id):
+    """
+    Mark a room as recently used.
+
+    Args:
+        room_id (int): Database id of the room.
+
+    """
+    try:
+        _LRU.move_to_end(room_id)
+    except KeyError:
+        _LRU[room_id] = None
+
+
+def forget_room(room_id):
+    """
+    Stop tracking a room, e.g. because it was deleted.
+
+    Args:
+        room_id (int): Database id of the room.
+
+    """
+    _LRU.pop(room_id, None)
+
+
+def _pinned_room_ids():
+    """
+    Rooms where connected players are, and the rooms their exits lead to.
+    """
+    pinned = set()
+    for session in SESSION_HANDLER.values():
+        puppet = session.puppet
+        location = puppet.location if puppet else None
+        if location is None:
+            continue
+        pinned.add(location.id)
+        for exit in location.exits:
+            if exit.destination:
+                pinned.add(exit.destination.id)
+    return pinned
+
+
+def _flush(obj):
+    obj.flush_from_cache()
+    if ObjectDB.get_cached_instance(obj.id) is not None:
+        return False
+    appearance.forget(obj.id)
+    return True
+
+
+def _drop_references(evicted_ids):
+    """
+    Forget cached foreign keys to evicted objects on the objects still
+    in the cache.
+    """
+    for obj in ObjectDB.get_all_cached_instances():
+        fields_cache = obj._state.fields_cache
+        for field in _OBJECT_FKS:
+            related = fields_cache.get(field)
+            if related is not None and related.id in evicted_ids:
+                del fields_cache[field]
+
+
+def _evict(room, evicted_ids):
+    """
+    Drop a room and its exits and items from the idmapper cache. The ids
+    of everything that was dropped are added to `evicted_ids`.
+
+    Returns:
+        evicted (bool): False if the room must (or did) stay resident.
+
+    """
+    evictable = [
+        obj
+        for obj in room.contents
+        if inherits_from(obj, settings.BASE_EXIT_TYPECLASS)
+        or inherits_from(obj, "typeclasses.items.Item")
+    ]
+    if any(write_behind.has_pending(obj) for obj in [room] + evictable):
+        return False
+
+    # the room first: if it stays, its contents cache still holds its
+    # exits and items, so they have to stay too
+    if not _flush(room):
+        _STATS["refused"] += 1
+        return False
+    evicted_ids.add(room.id)
+    for obj in evictable:
+        if _flush(obj):
+            evicted_ids.add(obj.id)
+            _STATS["evicted objects"] += 1
+    return True
+
+
+def sweep():
+    """
+    Evict least recently used rooms until the cache is within its cap, or
+    the per-sweep limit is reached.
+    """
+    _STATS["sweeps"] += 1
+    excess = len(_LRU) - settings.WORLD_CACHE_MAX_ROOMS
+    if excess <= 0:
+        return
+
+    pinned = _pinned_room_ids()
+    to_evict = min(excess, settings.WORLD_CACHE_SWEEP_BATCH)
+    evicted = 0
+    evicted_ids = set()
+    for room_id in list(islice(_LRU, to_evict + len(pinned))):
+        if evicted >= to_evict:
+            break
+        if room_id in pinned:
+            _LRU.move_to_end(room_id)
+            _STATS["pinned skips"] += 1
+            continue
+        room = ObjectDB.get_cached_instance(room_id)
+        if room is None or not inherits_from(room, settings.BASE_ROOM_TYPECLASS):
+            # already gone from the cache, or not a room after all
+            forget_room(room_id)
+            continue
+        if _evict(room, evicted_ids):
+            forget_room(room_id)
+            evicted += 1
+        else:
+            _LRU.move_to_end(room_id)
+    if evicted_ids:
+        _drop_references(evicted_ids)
+    _STATS["evicted rooms"] += evicted
+
+
+def cache_stats():
+    """
+    Returns:
+        stats (dict): Resident rooms, cached objects and eviction counters.
+
+    """
+    return dict(
+        _STATS,
+        **{
+            "tracked rooms": len(_LRU),
+            "max rooms": settings.WORLD_CACHE_MAX_ROOMS,
+            "cached objects": len(ObjectDB.get_all_cached_instances()),
+            "peak rss (kB)": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        }
+    )
+
+
+def start():
+    """
+    Start the periodic sweep. Called at server start.
+    """
+    global _LOOP
+    if _LOOP is None:
+        _LOOP = task.LoopingCall(sweep)
+        _LOOP.start(settings.WORLD_CACHE_SWEEP_INTERVAL, now=False)
+
+
+def stop():
+    """
+    Stop the periodic sweep.
+    """
+    global _LOOP
+    if _LOOP is not None and _LOOP.running:
+        _LOOP.stop()
+    _LOOP = None
+
+
+metrics.register("world cache", cache_stats)
@@ -0,0 +1,202 @@
+"""
+Write-behind Attributes
+
+Descriptions and senses (`desc`, `taste`, `touch`, `smell`) are written
+once and never changed, and building sessions produce a lot of them.
+Instead of saving each one to the database from inside the command,
+`set_attribute` puts the value straight into the object's Attribute
+cache (so `obj.db.desc`, `obj.attributes.has` etc see it at once),
+appends it to a local journal and queues it. `flush` then saves all
+queued Attributes in one transaction. It runs every
+`settings.WRITE_BEHIND_INTERVAL` seconds and when the server stops.
+
+An Attribute the object already has (such as the empty `desc` items get
+when they're created) is updated in place rather than getting a second
+row. An Attribute that doesn't exist yet only lives in the object's
+Attribute cache until the flush, so anything that reloads that whole
+cache in the meantime (`obj.attributes.all()`, which Evennia only uses
+in admin commands like `examine`) won't see it until the next flush.
+
+If the server dies before a flush, the journal still has the writes;
+`replay_journal` (called at server start) saves them all again, in
+order. The values are absolute, so writes that did reach the database
+are just written again with the same value.
+
+Written texts are also added to the text index (world/text_index.py).
+
+"""
+
+import json
+import os
+
+from django.conf import settings
+from django.db import transaction
+from evennia.objects.models import ObjectDB
+from evennia.typeclasses.attributes import Attribute
+from evennia.utils import logger
+from evennia.utils.dbserialize import to_pickle
+from twisted.internet import task
+
+from world import metrics, text_index
+
+# (obj, key) -> unsaved Attribute, in write order
+_PENDING = {}
+_LOOP = None
+
+_STATS = {"buffered": 0, "flushed": 0, "flushes": 0, "replayed": 0}
+
+
+def _append_journal(obj, key, value):
+    with open(settings.WRITE_BEHIND_JOURNAL, "a") as journal:
+        journal.write(json.dumps({"obj": obj.id, "key": key, "value": value}) + "\n")
+        journal.flush()
+        if settings.WRITE_BEHIND_FSYNC:
+            os.fsync(journal.fileno())
+
+
+def _truncate_journal():
+    if os.path.exists(settings.WRITE_BEHIND_JOURNAL):
+        open(settings.WRITE_BEHIND_JOURNAL, "w").close()
+
+
+def set_attribute(obj, key, value):
+    """
+    Set a (string) Attribute without waiting for the database.
+
+    The new value is visible through the object's Attribute handler
+    right away and is saved on the next flush.
+
+    Args:
+        obj (Object): The object to set the Attribute on.
+        key (str): Attribute key, without category.
+        value (str): The value to store. Must be JSON serializable so it
+            can be journaled.
+
+    """
+    handler = obj.attributes
+    attr = _PENDING.get((obj, key)) or handler.get(key, return_obj=True)
+    if attr is None:
+        attr = Attribute(
+            db_key=key,
+            db_category=None,
+            db_model=handler._model,
+            db_attrtype=handler._attrtype,
+        )
+    # not attr.value, which would save right away
+    attr.db_value = to_pickle(value)
+    _append_journal(obj, key, value)
+    # this mirrors what AttributeHandler.add does after saving
+    handler._setcache(key, None, attr)
+    _PENDING[(obj, key)] = attr
+    text_index.add(obj.id, key, value)
+    _STATS["buffered"] += 1
+
+
+def pending_count():
+    """
+    Returns:
+        count (int): Number of Attributes waiting to be saved.
+
+    """
+    return len(_PENDING)
+
+
+def has_pending(obj):
+    """
+    Args:
+        obj (Object): Object to check.
+
+    Returns:
+        pending (bool): If `obj` has Attributes that are not saved yet.
+
+    """
+    return any(pending_obj is obj for pending_obj, _ in _PENDING)
+
+
+def flush():
+    """
+    Save all buffered Attributes in a single transaction and clear the
+    journal. Objects deleted in the meantime are skipped.
+    """
+    if not _PENDING:
+        return
+
+    pending = list(_PENDING.items())
+    _PENDING.clear()
+    try:
+        with transaction.atomic():
+            for (obj, key), attr in pending:
+                if not obj.pk:
+                    continue
+                new = attr.pk is None
+                attr.save()
+                if new:
+                    obj.db_attributes.add(attr)
+    except Exception:
+        logger.log_trace("write_behind: flush failed, keeping journal for replay.")
+        for (obj, key), attr in pending:
+            _PENDING.setdefault((obj, key), attr)
+        return
+
+    _truncate_journal()
+    _STATS["flushed"] += len(pending)
+    _STATS["flushes"] += 1
+
+
+def replay_journal():
+    """
+    Save the journaled writes to the database, e.g. after a crash. Every
+    write is applied in journal order, so the last one of each Attribute
+    wins, whether or not it was flushed before; writes to objects that
+    are gone are skipped.
+    """
+    if not os.path.exists(settings.WRITE_BEHIND_JOURNAL):
+        return
+
+    with open(settings.WRITE_BEHIND_JOURNAL) as journal:
+        lines = journal.readlines()
+
+    # (object id, key) -> last value written, in journal order
+    latest = {}
+    for line in lines:
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            # a partially written last line from the crash
+            continue
+        latest.pop((entry["obj"], entry["key"]), None)
+        latest[(entry["obj"], entry["key"])] = entry["value"]
+
+    for (obj_id, key), value in latest.items():
+        obj = ObjectDB.objects.filter(id=obj_id).first()
+        if obj:
+            obj.attributes.add(key, value)
+            text_index.add(obj.id, key, value)
+            _STATS["replayed"] += 1
+
+    _truncate_journal()
+
+
+def start():
+    """
+    Replay the journal and start the periodic flush. Called at server start.
+    """
+    global _LOOP
+    replay_journal()
+    if _LOOP is None:
+        _LOOP = task.LoopingCall(flush)
+        _LOOP.start(settings.WRITE_BEHIND_INTERVAL, now=False)
+
+
+def stop():
+    """
+    Stop the periodic flush and save everything still buffered.
+    """
+    global _LOOP
+    if _LOOP is not None and _LOOP.running:
+        _LOOP.stop()
+    _LOOP = None
+    flush()
+
+
+metrics.register("write-behind", lambda: dict(_STATS, pending=len(_PENDING)))
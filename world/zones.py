@@ -0,0 +1,319 @@
+"""
+Zones
+
+The world grid is split into zones so that work can be limited to the
+part of the world where it matters. A room belongs to exactly one zone,
+stored as a tag with category "zone":
+
+- rooms inside one of the named regions in `settings.ZONES` belong to
+  that region,
+- other rooms with coordinates belong to the square tile of
+  `settings.ZONE_SIZE` rooms they fall in (named like "tile 2,-1"),
+- rooms without coordinates belong to the zone of the room they were
+  built from, or `settings.DEFAULT_ZONE`.
+
+Each `Zone` keeps its own set of rooms and of the characters currently
+in it. That gives it a broadcast scope (`Zone.msg`) and a ticker:
+callbacks subscribed with `Zone.subscribe` are only called while the
+zone has someone in it, so idle parts of the world cost nothing no
+matter how large the world grows. Exits leading into another zone are
+zone edges (see `Exit.crosses_zone`).
+
+The room-to-zone index is loaded by the startup warmup and carried over
+reloads by the reload snapshot.
+
+Zones are not owned by separate server processes. Evennia's Portal
+talks to exactly one Server over AMP and all typeclassed objects live
+in that Server's idmapper cache, so running zones in several worker
+processes would need a different Portal and a cross-process object
+cache rather than game-dir code. Work that should scale across cores
+belongs in the query pool (world/query_pool.py) instead. Exits that
+cross zones (`Exit.crosses_zone`) are where a handoff between workers
+would go.
+
+"""
+
+from django.conf import settings
+from evennia.objects.models import ObjectDB
+from evennia.server.sessionhandler import SESSION_HANDLER
+from evennia.utils import logger
+from twisted.internet import task
+
+from world import metrics, snapshot
+
+# room id -> zone name
+_ROOM_ZONES = {}
+# zone name -> Zone
+_ZONES = {}
+_READY = False
+_LOOP = None
+
+
+class Zone:
+    """
+    A region of the world with its own rooms, occupants and ticker.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.rooms = set()
+        self.occupants = set()
+        self.subscribers = []
+
+    def __repr__(self):
+        return "<Zone %s: %i rooms, %i occupants>" % (
+            self.name,
+            len(self.rooms),
+            len(self.occupants),
+        )
+
+    def msg(self, text, exclude=None, **kwargs):
+        """
+        Send a message to every character currently in the zone.
+
+        Args:
+            text (str): The message.
+            exclude (list, optional): Objects not to send to.
+
+        """
+        exclude = exclude or []
+        for obj_id in list(self.occupants):
+            obj = ObjectDB.get_cached_instance(obj_id)
+            if obj is None:
+                self.occupants.discard(obj_id)
+            elif obj not in exclude:
+                obj.msg(text, **kwargs)
+
+    def subscribe(self, callback):
+        """
+        Call `callback(zone)` on every zone tick while the zone is occupied.
+        """
+        if callback not in self.subscribers:
+            self.subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        """
+        Stop calling `callback` on zone ticks.
+        """
+        if callback in self.subscribers:
+            self.subscribers.remove(callback)
+
+
+def get_zone(name):
+    """
+    Returns:
+        zone (Zone): The zone with this name, created if needed.
+
+    """
+    try:
+        return _ZONES[name]
+    except KeyError:
+        zone = _ZONES[name] = Zone(name)
+        return zone
+
+
+def all_zones():
+    """
+    Returns:
+        zones (list): All zones known so far.
+
+    """
+    return list(_ZONES.values())
+
+
+def zone_name_for(x, y):
+    """
+    Returns:
+        name (str): The name of the zone coordinates (x, y) belong to.
+
+    """
+    for name, (min_x, min_y, max_x, max_y) in settings.ZONES.items():
+        if min_x <= x <= max_x and min_y <= y <= max_y:
+            return name
+    return "tile %i,%i" % (x // settings.ZONE_SIZE, y // settings.ZONE_SIZE)
+
+
+def _index(room_id, name):
+    old = _ROOM_ZONES.get(room_id)
+    if old == name:
+        return
+    if old is not None:
+        get_zone(old).rooms.discard(room_id)
+    if name is None:
+        _ROOM_ZONES.pop(room_id, None)
+    else:
+        _ROOM_ZONES[room_id] = name
+        get_zone(name).rooms.add(room_id)
+
+
+def index_room(room_id, name):
+    """
+    Record the zone of a room in the index without touching its tag.
+    Used when loading the index from the database.
+    """
+    _index(room_id, name)
+
+
+def assign(room, name):
+    """
+    Put a room in a zone.
+
+    Args:
+        room (Room): The room.
+        name (str): Name of the zone.
+
+    """
+    old = room.tags.get(category="zone")
+    if old != name:
+        if old is not None:
+            room.tags.remove(old, category="zone")
+        room.tags.add(name, category="zone")
+    _index(room.id, name)
+
+
+def remove_room(room_id):
+    """
+    Drop a deleted room from its zone.
+    """
+    _index(room_id, None)
+
+
+def zone_name_of(room):
+    """
+    Returns:
+        name (str or None): The name of the room's zone, or None if `room`
+            is None.
+
+    """
+    if room is None:
+        return None
+    try:
+        return _ROOM_ZONES[room.id]
+    except KeyError:
+        pass
+    name = room.tags.get(category="zone")
+    if name is None:
+        # rooms built before zones existed
+        x, y = getattr(room, "x", None), getattr(room, "y", None)
+        name = zone_name_for(x, y) if x is not None and y is not None else settings.DEFAULT_ZONE
+    _index(room.id, name)
+    return name
+
+
+def zone_of(room):
+    """
+    Returns:
+        zone (Zone or None): The zone the room belongs to.
+
+    """
+    name = zone_name_of(room)
+    return get_zone(name) if name is not None else None
+
+
+def move_occupant(obj, source_location, target_location):
+    """
+    Keep the occupant sets up to date as a character moves (or leaves the
+    grid, with `target_location` None).
+    """
+    source = zone_name_of(source_location)
+    target = zone_name_of(target_location)
+    if source == target:
+        return
+    if source is not None:
+        get_zone(source).occupants.discard(obj.id)
+    if target is not None:
+        get_zone(target).occupants.add(obj.id)
+
+
+def is_ready():
+    """
+    Returns:
+        ready (bool): If every room's zone has been loaded into the index.
+
+    """
+    return _READY
+
+
+def mark_ready(ready=True):
+    """
+    Mark the index as complete (or not), once every room is loaded.
+    """
+    global _READY
+    _READY = ready
+
+
+def _sync_occupants():
+    """
+    Rebuild the occupant sets from the connected sessions. Catches
+    characters whose moves were missed, e.g. sessions restored after a
+    reload.
+    """
+    occupants = {}
+    for session in SESSION_HANDLER.values():
+        puppet = session.puppet
+        if puppet and puppet.location:
+            occupants.setdefault(zone_name_of(puppet.location), set()).add(puppet.id)
+    for name, zone in _ZONES.items():
+        zone.occupants = occupants.get(name, set())
+
+
+def tick():
+    """
+    Call the subscribers of every occupied zone.
+    """
+    _sync_occupants()
+    for zone in list(_ZONES.values()):
+        if not zone.occupants:
+            continue
+        for callback in list(zone.subscribers):
+            try:
+                callback(zone)
+            except Exception:
+                logger.log_trace("Zone tick failed in %s." % zone.name)
+
+
+def start():
+    """
+    Start the zone ticker. Called at server start.
+    """
+    global _LOOP
+    if _LOOP is None:
+        _LOOP = task.LoopingCall(tick)
+        _LOOP.start(settings.ZONE_TICK_INTERVAL, now=False)
+
+
+def stop():
+    """
+    Stop the zone ticker.
+    """
+    global _LOOP
+    if _LOOP is not None and _LOOP.running:
+        _LOOP.stop()
+    _LOOP = None
+
+
+def _dump():
+    return dict(_ROOM_ZONES) if _READY else None
+
+
+def _load(room_zones):
+    _ROOM_ZONES.clear()
+    for zone in _ZONES.values():
+        zone.rooms.clear()
+    for room_id, name in room_zones.items():
+        _index(room_id, name)
+    mark_ready()
+
+
+def zone_stats():
+    occupied = [zone for zone in _ZONES.values() if zone.occupants]
+    return {
+        "zones": len(_ZONES),
+        "occupied zones": len(occupied),
+        "indexed rooms": len(_ROOM_ZONES),
+        "largest zone": max((len(zone.rooms) for zone in _ZONES.values()), default=0),
+    }
+
+
+snapshot.register("zones", _dump, _load)
+metrics.register("zones", zone_stats)